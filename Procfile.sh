@@ -1 +1,3 @@
-python manage.py migrate
\ No newline at end of file
+python manage.py migrate
+# Sends queued emails and runs cohort assignment, see jobs.runner
+python manage.py runjobs &
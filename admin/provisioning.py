@@ -0,0 +1,122 @@
+from django.db import transaction
+
+from admin.models import (
+    Department,
+    Faculty,
+    FacultyDepartmentLink,
+    Student,
+    StudentDepartmentLink,
+)
+from users.models import Role, User, UserInstitutionLink
+from utils.principal import invalidate_principal
+
+# Member model, its department link model and the field the member id goes to
+MEMBER_MODELS = {
+    "Faculty": (Faculty, FacultyDepartmentLink, "faculty_id"),
+    "Student": (Student, StudentDepartmentLink, "roll_number"),
+}
+
+
+def validate_memberships(memberships, institution_id):
+    """
+    Check a batch of {"member_id", "user_id", "department_ids"} dicts with
+    one IN query per table. Returns a list of {"index", "message"} errors,
+    empty when the whole batch can be provisioned.
+    """
+    user_ids = [membership["user_id"] for membership in memberships]
+    department_ids = {
+        department_id
+        for membership in memberships
+        for department_id in membership["department_ids"]
+    }
+    users = set(User.objects.filter(id__in=user_ids).values_list("id", flat=True))
+    linked = set(
+        UserInstitutionLink.objects.filter(
+            user_id__in=user_ids, institution_id=institution_id
+        ).values_list("user_id", flat=True)
+    )
+    members = set(
+        Faculty.objects.filter(user_id__in=user_ids).values_list("user_id", flat=True)
+    ) | set(
+        Student.objects.filter(user_id__in=user_ids).values_list("user_id", flat=True)
+    )
+    departments = set(
+        Department.objects.filter(id__in=department_ids).values_list("id", flat=True)
+    )
+    errors = []
+    seen = set()
+    for index, membership in enumerate(memberships):
+        user_id = membership["user_id"]
+        if user_id not in users:
+            message = "User not found"
+        elif user_id in seen:
+            message = "User is listed more than once"
+        elif user_id in linked:
+            message = "User already has role in this institution"
+        elif user_id in members:
+            message = "User is already a faculty or student"
+        elif not set(membership["department_ids"]) <= departments:
+            message = "Department not found"
+        else:
+            seen.add(user_id)
+            continue
+        seen.add(user_id)
+        errors.append({"index": index, "message": message})
+    return errors
+
+
+@transaction.atomic
+def provision_members(
+    role_name, memberships, institution_id, class_or_semester=None
+):
+    """
+    Give a validated batch of users a Faculty or Student role in an
+    institution. Every table is written with one bulk_create and nothing
+    is written if any of them fails.
+    """
+    model, department_link_model, member_field = MEMBER_MODELS[role_name]
+    role = Role.objects.get(name=role_name)
+    UserRole = User.role.through
+    UserRole.objects.bulk_create(
+        [
+            UserRole(user_id=membership["user_id"], role_id=role.id)
+            for membership in memberships
+        ],
+        ignore_conflicts=True,
+    )
+    UserInstitutionLink.objects.bulk_create(
+        [
+            UserInstitutionLink(
+                user_id=membership["user_id"],
+                institution_id=institution_id,
+                role=role,
+            )
+            for membership in memberships
+        ]
+    )
+    extra = {"class_or_semester": class_or_semester} if model is Student else {}
+    member_rows = [
+        model(
+            user_id=membership["user_id"],
+            **{member_field: membership["member_id"]},
+            **extra,
+        )
+        for membership in memberships
+    ]
+    model.objects.bulk_create(member_rows)
+    department_link_field = model._meta.model_name
+    department_link_model.objects.bulk_create(
+        [
+            department_link_model(
+                **{department_link_field: member}, department_id=department_id
+            )
+            for member, membership in zip(member_rows, memberships)
+            for department_id in membership["department_ids"]
+        ]
+    )
+    transaction.on_commit(
+        lambda: invalidate_principal(
+            *(membership["user_id"] for membership in memberships)
+        )
+    )
+    return len(member_rows)
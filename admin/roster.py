@@ -0,0 +1,190 @@
+import csv
+import codecs
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+
+from admin.models import InstitutionDepartmentLink
+from admin.provisioning import provision_members, validate_memberships
+from users.models import User
+from utils.utils import Echo
+
+ROSTER_CHUNK_SIZE = 500
+ROSTER_ROLES = {"student": "Student", "faculty": "Faculty"}
+RESULT_COLUMNS = ["row", "email", "status", "message"]
+# New users get the email as username too, so it has to fit both columns
+EMAIL_MAX_LENGTH = min(
+    User._meta.get_field("email").max_length,
+    User._meta.get_field("username").max_length,
+)
+MEMBER_ID_MAX_LENGTH = 100
+
+
+def get_department_ids(institution_id):
+    # Departments of the institution keyed by lower cased name
+    return {
+        name.lower(): department_id
+        for name, department_id in InstitutionDepartmentLink.objects.filter(
+            institution_id=institution_id
+        ).values_list("department__name", "department_id")
+    }
+
+
+def parse_row(row, department_ids):
+    """
+    Turn a roster row with the columns email, roll_number, semester,
+    departments and role into a membership. Departments are names
+    separated by semicolons and role defaults to student.
+    """
+    email = (row.get("email") or "").strip()
+    try:
+        validate_email(email)
+    except ValidationError:
+        raise ValueError("Invalid email")
+    if len(email) > EMAIL_MAX_LENGTH:
+        raise ValueError(f"Email is longer than {EMAIL_MAX_LENGTH} characters")
+    role = ROSTER_ROLES.get((row.get("role") or "student").strip().lower())
+    if role is None:
+        raise ValueError("Role must be student or faculty")
+    if not (member_id := (row.get("roll_number") or "").strip()):
+        raise ValueError("Roll number is required")
+    if len(member_id) > MEMBER_ID_MAX_LENGTH:
+        raise ValueError(
+            f"Roll number is longer than {MEMBER_ID_MAX_LENGTH} characters"
+        )
+    semester = None
+    if role == "Student":
+        try:
+            semester = int(row.get("semester") or "")
+        except ValueError:
+            raise ValueError("Semester must be a number")
+    names = [
+        name.strip().lower() for name in (row.get("departments") or "").split(";")
+    ]
+    if missing := [name for name in names if name and name not in department_ids]:
+        raise ValueError(f"Department not found: {', '.join(missing)}")
+    return {
+        "email": email,
+        "role": role,
+        "semester": semester,
+        "member_id": member_id,
+        "department_ids": [department_ids[name] for name in names if name],
+    }
+
+
+def get_or_create_users(emails):
+    """
+    Ids of the users with these emails, creating the missing ones in bulk,
+    and the emails that cannot be created because another user already
+    has them as username. One query finds both.
+    """
+    emails = set(emails)
+    user_ids = {}
+    usernames = set()
+    for email, username, user_id in User.objects.filter(
+        Q(email__in=emails) | Q(username__in=emails)
+    ).values_list("email", "username", "id"):
+        if email in emails:
+            user_ids[email] = user_id
+        usernames.add(username)
+    taken = {email for email in emails if email not in user_ids and email in usernames}
+    if missing := [
+        email for email in emails if email not in user_ids and email not in taken
+    ]:
+        # Without a usable password they sign in after a password reset
+        password = make_password(None)
+        User.objects.bulk_create(
+            [User(username=email, email=email, password=password) for email in missing]
+        )
+        user_ids.update(
+            User.objects.filter(email__in=missing).values_list("email", "id")
+        )
+    return user_ids, taken
+
+
+@transaction.atomic
+def import_chunk(chunk, institution_id, department_ids):
+    # Result rows for one chunk of (row number, csv row) pairs
+    results = {}
+    parsed = []
+    seen = set()
+    for row_number, row in chunk:
+        try:
+            member = parse_row(row, department_ids)
+            # Rows with different roles land in different batches, so
+            # validate_memberships alone would not catch the repeat
+            if member["email"] in seen:
+                raise ValueError("Email is listed more than once")
+        except ValueError as exc:
+            results[row_number] = (row.get("email"), "error", str(exc))
+            continue
+        seen.add(member["email"])
+        parsed.append((row_number, member))
+    user_ids, taken = get_or_create_users(seen)
+    groups = {}
+    for row_number, member in parsed:
+        if member["email"] in taken:
+            results[row_number] = (
+                member["email"],
+                "error",
+                "Email is already another user's username",
+            )
+            continue
+        member["user_id"] = user_ids[member["email"]]
+        groups.setdefault((member["role"], member["semester"]), []).append(
+            (row_number, member)
+        )
+    for (role, semester), rows in groups.items():
+        memberships = [member for _, member in rows]
+        failed = {}
+        for error in validate_memberships(memberships, institution_id):
+            failed[error["index"]] = error["message"]
+        valid = [member for i, member in enumerate(memberships) if i not in failed]
+        if valid:
+            provision_members(role, valid, institution_id, semester)
+        for index, (row_number, member) in enumerate(rows):
+            if index in failed:
+                results[row_number] = (member["email"], "error", failed[index])
+            else:
+                results[row_number] = (
+                    member["email"],
+                    "created",
+                    f"{role} role given",
+                )
+    return [(row_number, *results[row_number]) for row_number, _ in chunk]
+
+
+def import_roster(upload, institution_id):
+    """
+    Stream a roster CSV into memberships ROSTER_CHUNK_SIZE rows at a time and
+    yield a CSV result line per row as each chunk is written, so memory is
+    bounded by the chunk size and not by the file.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(RESULT_COLUMNS)
+    department_ids = get_department_ids(institution_id)
+    # Header is line 1, so data rows are numbered from 2 like a spreadsheet
+    reader = csv.DictReader(codecs.iterdecode(upload, "utf-8-sig"))
+    rows = enumerate(reader, start=2)
+    try:
+        while chunk := list(islice(rows, ROSTER_CHUNK_SIZE)):
+            try:
+                results = import_chunk(chunk, institution_id, department_ids)
+            except DatabaseError:
+                # The headers are already sent, so report the chunk instead
+                # of breaking the response, and go on with the next one
+                message = "Chunk could not be saved, none of its rows were added"
+                results = [
+                    (row_number, row.get("email"), "error", message)
+                    for row_number, row in chunk
+                ]
+            for result in results:
+                yield writer.writerow(result)
+    except (csv.Error, UnicodeDecodeError) as exc:
+        yield writer.writerow(
+            ["", "", "error", f"File could not be read further: {exc}"]
+        )
@@ -1,3 +1,211 @@
+import csv
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.db import DatabaseError
 from django.test import TestCase
 
-# Create your tests here.
+from admin.models import (
+    Department,
+    Faculty,
+    Institution,
+    InstitutionDepartmentLink,
+    Student,
+    StudentDepartmentLink,
+)
+from admin.provisioning import provision_members, validate_memberships
+from admin.roster import import_roster
+from users.models import Role, User, UserInstitutionLink
+
+
+class InstitutionTestCase(TestCase):
+    def setUp(self):
+        for name in ("Student", "Faculty"):
+            Role.objects.create(name=name)
+        self.institution = Institution.objects.create(
+            name="CET", place="TVM", institution_type="COLLEGE"
+        )
+        self.department = Department.objects.create(name="CSE")
+        InstitutionDepartmentLink.objects.create(
+            institution=self.institution, department=self.department
+        )
+
+    def create_user(self, name, email=None):
+        return User.objects.create(
+            username=f"{name}@example.com", email=email or f"{name}@example.com"
+        )
+
+
+class ProvisioningTests(InstitutionTestCase):
+    def membership(self, user, member_id="R1", department_ids=None):
+        return {
+            "member_id": member_id,
+            "user_id": str(user.id),
+            "department_ids": department_ids or [str(self.department.id)],
+        }
+
+    def test_each_membership_is_checked(self):
+        users = [self.create_user(f"user{number}") for number in range(5)]
+        UserInstitutionLink.objects.create(
+            user=users[1], institution=self.institution
+        )
+        Faculty.objects.create(faculty_id="F1", user=users[2])
+        errors = validate_memberships(
+            [
+                self.membership(users[0]),
+                {**self.membership(users[0]), "member_id": "R2"},
+                self.membership(users[1]),
+                self.membership(users[2]),
+                self.membership(users[3], department_ids=["missing"]),
+                {**self.membership(users[4]), "user_id": "missing"},
+                self.membership(users[4]),
+            ],
+            self.institution.id,
+        )
+        self.assertEqual(
+            [(error["index"], error["message"]) for error in errors],
+            [
+                (1, "User is listed more than once"),
+                (2, "User already has role in this institution"),
+                (3, "User is already a faculty or student"),
+                (4, "Department not found"),
+                (5, "User not found"),
+            ],
+        )
+
+    def test_provision_gives_every_member_the_role(self):
+        users = [self.create_user(f"user{number}") for number in range(3)]
+        memberships = [
+            self.membership(user, f"R{number}") for number, user in enumerate(users)
+        ]
+        count = provision_members("Student", memberships, self.institution.id, 3)
+        self.assertEqual(count, 3)
+        self.assertEqual(
+            sorted(Student.objects.values_list("roll_number", "class_or_semester")),
+            [("R0", 3), ("R1", 3), ("R2", 3)],
+        )
+        self.assertEqual(StudentDepartmentLink.objects.count(), 3)
+        self.assertEqual(
+            UserInstitutionLink.objects.filter(role__name="Student").count(), 3
+        )
+        self.assertEqual(User.objects.filter(role__name="Student").count(), 3)
+
+    def test_provision_writes_nothing_if_a_table_fails(self):
+        users = [self.create_user(f"user{number}") for number in range(3)]
+        memberships = [self.membership(user) for user in users]
+        with mock.patch.object(
+            StudentDepartmentLink.objects, "bulk_create", side_effect=DatabaseError
+        ):
+            with self.assertRaises(DatabaseError):
+                provision_members("Student", memberships, self.institution.id, 3)
+        self.assertFalse(Student.objects.exists())
+        self.assertFalse(UserInstitutionLink.objects.exists())
+        self.assertFalse(User.objects.filter(role__name="Student").exists())
+
+
+class RosterTests(InstitutionTestCase):
+    def import_roster(self, *rows):
+        content = "email,roll_number,semester,departments,role\n" + "".join(
+            f"{row}\n" for row in rows
+        )
+        result = "".join(import_roster(BytesIO(content.encode()), self.institution.id))
+        return [
+            (int(row["row"]), row["email"], row["status"], row["message"])
+            for row in csv.DictReader(StringIO(result))
+        ]
+
+    def test_each_row_is_reported(self):
+        self.create_user("taken", email="other@example.com")
+        existing = self.create_user("existing")
+        results = self.import_roster(
+            "new@example.com,R1,3,cse,student",
+            "existing@example.com,F1,,CSE,faculty",
+            "not-an-email,R2,3,,",
+            "bad-role@example.com,R3,3,,admin",
+            "new@example.com,F2,,,faculty",
+            "taken@example.com,R4,3,,",
+            f"long@example.com,{'R' * 101},3,,",
+            "dept@example.com,R5,3,ECE,",
+            "no-semester@example.com,R6,,,",
+            f"{'a' * 40}@example.com,R7,3,,",
+        )
+        self.assertEqual(
+            results,
+            [
+                (2, "new@example.com", "created", "Student role given"),
+                (3, "existing@example.com", "created", "Faculty role given"),
+                (4, "not-an-email", "error", "Invalid email"),
+                (5, "bad-role@example.com", "error", "Role must be student or faculty"),
+                (6, "new@example.com", "error", "Email is listed more than once"),
+                (
+                    7,
+                    "taken@example.com",
+                    "error",
+                    "Email is already another user's username",
+                ),
+                (
+                    8,
+                    "long@example.com",
+                    "error",
+                    "Roll number is longer than 100 characters",
+                ),
+                (9, "dept@example.com", "error", "Department not found: ece"),
+                (10, "no-semester@example.com", "error", "Semester must be a number"),
+                (
+                    11,
+                    f"{'a' * 40}@example.com",
+                    "error",
+                    "Email is longer than 50 characters",
+                ),
+            ],
+        )
+        self.assertEqual(
+            Student.objects.get(user__email="new@example.com").roll_number, "R1"
+        )
+        self.assertEqual(Faculty.objects.get().user_id, str(existing.id))
+        self.assertFalse(User.objects.filter(email="taken@example.com").exists())
+
+    def test_rows_already_members_are_reported(self):
+        self.import_roster("new@example.com,R1,3,,")
+        self.assertEqual(
+            self.import_roster("new@example.com,R1,3,,"),
+            [
+                (
+                    2,
+                    "new@example.com",
+                    "error",
+                    "User already has role in this institution",
+                )
+            ],
+        )
+
+    @mock.patch("admin.roster.ROSTER_CHUNK_SIZE", 2)
+    def test_failed_chunk_is_rolled_back_and_reported(self):
+        calls = []
+
+        def provision(*args, **kwargs):
+            # The first chunk fails after its users were created
+            calls.append(args)
+            if len(calls) == 1:
+                raise DatabaseError
+            return provision_members(*args, **kwargs)
+
+        with mock.patch("admin.roster.provision_members", provision):
+            results = self.import_roster(
+                "a@example.com,R1,3,,",
+                "b@example.com,R2,3,,",
+                "c@example.com,R3,3,,",
+            )
+        message = "Chunk could not be saved, none of its rows were added"
+        self.assertEqual(
+            results,
+            [
+                (2, "a@example.com", "error", message),
+                (3, "b@example.com", "error", message),
+                (4, "c@example.com", "created", "Student role given"),
+            ],
+        )
+        # Users created for the failed chunk are rolled back with it
+        self.assertEqual(
+            list(User.objects.values_list("email", flat=True)), ["c@example.com"]
+        )
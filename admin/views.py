@@ -1,12 +1,18 @@
-from ninja import Router
+from ninja import Router, File
+from ninja.files import UploadedFile
 from typing import Any
 
 from django.shortcuts import get_object_or_404
 from django.db.models import Prefetch, Q
 from django.db import IntegrityError
+from django.http import StreamingHttpResponse
 
 from utils.authentication import role_required, AuthBearer
+from utils.principal import invalidate_principal
 from utils.utils import search_queryset
+from utils.singleflight import coalesce_queryset
+from admin.provisioning import provision_members, validate_memberships
+from admin.roster import import_roster
 from admin.schemas import *
 from users.models import User, Role, UserInstitutionLink, UserCommunityLink
 from admin.models import Institution, Community, EducationSystem
@@ -32,6 +38,7 @@ def give_institution_role(request, data: GiveRolesSchema):
     role = Role.objects.get(name="Institution")
     user.role.add(role)
     UserInstitutionLink.objects.create(user=user, institution=institution, role=role)
+    invalidate_principal(user.id)
     return 200, {"message": "Institution role given"}
 
 
@@ -53,60 +60,51 @@ def give_community_role(request, data: GiveRolesSchema):
     role = Role.objects.get(name="Community")
     user.role.add(role)
     UserCommunityLink.objects.create(user=user, community=community, role=role)
+    invalidate_principal(user.id)
     return 200, {"message": "Community role given"}
 
 
+def give_member_role(request, role_name, data):
+    user_link = request.principal.require("institution_link")
+    memberships = [membership.dict() for membership in data.user_membership_id]
+    if role_name == "Student" and data.class_or_semester is None:
+        return 400, {"message": "Semester is required for students"}
+    if errors := validate_memberships(memberships, user_link.institution_id):
+        return 400, {"message": "Invalid memberships", "errors": errors}
+    count = provision_members(
+        role_name, memberships, user_link.institution_id, data.class_or_semester
+    )
+    return 200, {"message": f"{role_name} role given", "count": count}
+
+
 @router.post("/role/faculty/", response={200: Any, 400: Any})
 @role_required(["Institution"])
 def give_faculty_role(request, data: GiveRolesMembershipSchema):
-    user_link = get_object_or_404(UserInstitutionLink, user__id=request.auth["user"])
-    role = Role.objects.get(name="Faculty")
-    for datas in data.user_membership_id:
-        departments = Department.objects.filter(id=datas.department_ids[0])
-        user = User.objects.get(id=datas.user_id)
-        user.role.add(role)
-        try:
-            UserInstitutionLink.objects.create(
-                user=user, institution=user_link.institution, role=role
-            )
-        except IntegrityError:
-            return 400, {"message": "User already has role in this institution"}
-        faculty = Faculty.objects.create(faculty_id=datas.member_id, user=user)
-        for department in departments:
-            FacultyDepartmentLink.objects.create(faculty=faculty, department=department)
-    return 200, {"message": "Faculty role given"}
+    return give_member_role(request, "Faculty", data)
 
 
 @router.post("/role/student/", response={200: Any, 400: Any})
 @role_required(["Institution"])
 def give_student_role(request, data: GiveRolesMembershipSchema):
-    user_link = get_object_or_404(UserInstitutionLink, user__id=request.auth["user"])
-    role = Role.objects.get(name="Student")
-    for datas in data.user_membership_id:
-        departments = Department.objects.filter(id=datas.department_ids[0])
-        user = User.objects.get(id=datas.user_id)
-        user.role.add(role)
-        try:
-            UserInstitutionLink.objects.create(
-                user=user, institution=user_link.institution, role=role
-            )
-        except IntegrityError:
-            return 400, {"message": "User already has role in this institution"}
-        student = Student.objects.create(
-            roll_number=datas.member_id,
-            user=user,
-            class_or_semester=data.class_or_semester,
-        )
-        for department in departments:
-            StudentDepartmentLink.objects.create(student=student, department=department)
-    return 200, {"message": "Student role given"}
+    return give_member_role(request, "Student", data)
+
+
+@router.post("/roster/", response={200: Any, 400: Any})
+@role_required(["Institution"])
+def upload_roster(request, file: UploadedFile = File(...)):
+    user_link = request.principal.require("institution_link")
+    response = StreamingHttpResponse(
+        import_roster(file, user_link.institution_id), content_type="text/csv"
+    )
+    response["Content-Disposition"] = 'attachment; filename="roster-result.csv"'
+    return response
 
 
 @router.post("/role/community-member/", response={200: Any, 400: Any})
 @role_required(["Community"])
 def give_community_member_role(request, data: GiveRolesSchema):
     users = User.objects.filter(id__in=data.user_ids)
-    user_link = get_object_or_404(UserCommunityLink, user__id=request.auth["user"])
+    user_link = request.principal.require("community_link")
 
     role = Role.objects.get(name="CommunityMember")
     for user in users:
@@ -114,6 +112,7 @@ def give_community_member_role(request, data: GiveRolesSchema):
         UserCommunityLink.objects.create(
             user=user, community=user_link.community, role=role
         )
+        invalidate_principal(user.id)
     return 200, {"message": "Community Member role given"}
 
 
@@ -188,8 +187,7 @@ def create_module(request, data: ModuleInSchema):
 @role_required(["Institution"])
 def link_institution_department(request, data: InstitutionLink):
     data = data.dict()
-    user_link = get_object_or_404(UserInstitutionLink, user__id=request.auth["user"])
-    institution = get_object_or_404(Institution, id=user_link.institution_id)
+    institution = request.principal.require("institution_link").institution
     for id in data["link_id"]:
         department = get_object_or_404(Department, id=id)
         try:
@@ -205,8 +203,7 @@ def link_institution_department(request, data: InstitutionLink):
 @role_required(["Institution"])
 def link_institution_course(request, data: InstitutionLink):
     data = data.dict()
-    user_link = get_object_or_404(UserInstitutionLink, user__id=request.auth["user"])
-    institution = get_object_or_404(Institution, id=user_link.institution_id)
+    institution = request.principal.require("institution_link").institution
     for id in data["link_id"]:
         course = get_object_or_404(Course, id=id)
         try:
@@ -220,8 +217,7 @@ def link_institution_course(request, data: InstitutionLink):
 @role_required(["Institution"])
 def link_faculty_course(request, data: FacultyCourseLinkSchema):
     data = data.dict()
-    user_link = get_object_or_404(UserInstitutionLink, user__id=request.auth["user"])
-    institution = get_object_or_404(Institution, id=user_link.institution_id)
+    institution = request.principal.require("institution_link").institution
     faculty = get_object_or_404(Faculty, id=data["faculty_id"])
     if not UserInstitutionLink.objects.filter(
         user__id=faculty.user.id, institution=institution
@@ -273,9 +269,7 @@ def get_community(request, search: str = None):
 def get_department(request, search: str = None, status: str = None):
     department = Department.objects.all()
     if "Institution" in request.auth["roles"]:
-        institution = UserInstitutionLink.objects.filter(
-            user_id=request.auth["user"]
-        ).first()
+        institution = request.principal.institution_link
         department_ids = InstitutionDepartmentLink.objects.filter(
             institution_id=institution.institution_id
         ).values_list("department_id", flat=True)
@@ -284,13 +278,13 @@ def get_department(request, search: str = None, status: str = None):
         elif status == "unlinked":
             department = Department.objects.exclude(id__in=department_ids)
     if "Faculty" in request.auth["roles"]:
-        faculty_instance = Faculty.objects.filter(user_id=request.auth["user"]).first()
+        faculty_instance = request.principal.faculty
         faculty_department = FacultyDepartmentLink.objects.filter(
             faculty=faculty_instance
         ).values_list("department_id", flat=True)
         department = Department.objects.filter(id__in=faculty_department)
     if "Student" in request.auth["roles"]:
-        student_instance = Student.objects.filter(user_id=request.auth["user"]).first()
+        student_instance = request.principal.student
         student_department = StudentDepartmentLink.objects.filter(
             student=student_instance
         ).values_list("department_id", flat=True)
@@ -305,9 +299,7 @@ def get_department(request, search: str = None, status: str = None):
 def get_course(request, search: str = None, status: str = None):
     course = Course.objects.all()
     if "Institution" in request.auth["roles"]:
-        institution = UserInstitutionLink.objects.filter(
-            user_id=request.auth["user"]
-        ).first()
+        institution = request.principal.institution_link
         course_ids = InstitutionCourseLink.objects.filter(
             institution_id=institution.institution_id
         ).values_list("course_id", flat=True)
@@ -316,14 +308,14 @@ def get_course(request, search: str = None, status: str = None):
         elif status == "unlinked":
             course = Course.objects.exclude(id__in=course_ids)
     if "Faculty" in request.auth["roles"]:
-        faculty_instance = Faculty.objects.filter(user_id=request.auth["user"]).first()
+        faculty_instance = request.principal.faculty
         course_link = CourseFacultyLink.objects.filter(
             faculty=faculty_instance
         ).values_list("course_id", flat=True)
         course = Course.objects.filter(id__in=course_link)
     if "Student" in request.auth["roles"]:
-        user_link = get_object_or_404(UserInstitutionLink, user__id=request.auth["user"])
-        student_instance = Student.objects.filter(user_id=request.auth["user"]).first()
+        user_link = request.principal.require("institution_link")
+        student_instance = request.principal.student
         student_department = StudentDepartmentLink.objects.filter(
             student=student_instance
         ).values_list("department_id", flat=True)
@@ -332,30 +324,29 @@ def get_course(request, search: str = None, status: str = None):
         ).values_list("course_id", flat=True)
         course = Course.objects.filter(
             class_or_semester=student_instance.class_or_semester, id__in=course_link,
-            courseinstitutionlink__institution=user_link.institution
+            institutioncourselink__institution=user_link.institution
         )
     if search:
-        course = search_queryset(
-            course,
-            search,
-            ["name", "code", "education_system_name", "class_or_semester"],
-        )
-    return 200, course
+        course = search_queryset(course, search, ["name", "code"])
+    return 200, coalesce_queryset(course)
 
 
 @router.get("/module", response={200: List[ModuleOutSchema], 400: Any})
 @role_required(["Admin", "Institution", "Faculty", "Student"])
 def get_modules(request, id: str):
-    get_object_or_404(Course, id=id)
-    if not (modules := Module.objects.filter(course_id=id).all()):
+    modules = coalesce_queryset(
+        Module.objects.filter(course_id=id).order_by("module_number")
+    )
+    if not modules:
+        get_object_or_404(Course, id=id)
         return 400, {"message": "No modules found for this course"}
-    return 200, modules.order_by("module_number")
+    return 200, modules
 
 
 @router.get("/faculty", response={200: List[FacultyOutSchema], 400: Any})
 @role_required(["Institution"])
 def get_faculty(request, search: str = None):
-    user_link = get_object_or_404(UserInstitutionLink, user__id=request.auth["user"])
+    user_link = request.principal.require("institution_link")
     faculty_user_ids = UserInstitutionLink.objects.filter(
         institution=user_link.institution, role__name="Faculty"
     ).values_list("user_id", flat=True)
@@ -370,17 +361,13 @@ def get_faculty(request, search: str = None):
 def get_student(request, course_id: str = None, search: str = None):
     student = Student.objects.all()
     if "Institution" in request.auth["roles"]:
-        user_link = get_object_or_404(
-            UserInstitutionLink, user__id=request.auth["user"]
-        )
+        user_link = request.principal.require("institution_link")
         student_user_ids = UserInstitutionLink.objects.filter(
             institution=user_link.institution, role__name="Student"
         ).values_list("user_id", flat=True)
         student = student.filter(user_id__in=student_user_ids)
     elif "Faculty" in request.auth["roles"]:
-        user_link = get_object_or_404(
-            UserInstitutionLink, user__id=request.auth["user"]
-        )
+        user_link = request.principal.require("institution_link")
         course = get_object_or_404(
             Course,
             id=course_id,
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from jobs.runner import run_worker, worker_name
+from quizverse_backend.settings import JOB_POLL_INTERVAL
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no jobs are due instead of polling.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=JOB_POLL_INTERVAL,
+            help="Seconds to sleep when no jobs are due.",
+        )
+
+    def handle(self, *args, **options):
+        worker = worker_name()
+        self.stdout.write(f"Job worker {worker} started")
+        ran = run_worker(worker, options["once"], options["poll_interval"])
+        self.stdout.write(f"Ran {ran} jobs")
@@ -0,0 +1,33 @@
+import uuid
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    STATUS_CHOICES = [
+        ("QUEUED", "queued"),
+        ("RUNNING", "running"),
+        ("DONE", "done"),
+        ("FAILED", "failed"),
+    ]
+
+    id = models.CharField(primary_key=True, max_length=36, default=uuid.uuid4)
+    # Name the task was registered under, see jobs.tasks
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default="QUEUED")
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    # Not claimed before this, pushed back after every failed attempt
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, null=True)
+    locked_at = models.DateTimeField(null=True)
+    result = models.JSONField(null=True)
+    error = models.TextField(blank=True, default="")
+    created_by = models.ForeignKey("users.User", on_delete=models.SET_NULL, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "job"
+        indexes = [models.Index(fields=["status", "run_at"])]
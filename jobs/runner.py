@@ -0,0 +1,148 @@
+import os
+import random
+import socket
+import time
+import logging
+import traceback
+from datetime import timedelta
+
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.tasks import registry
+from quizverse_backend.settings import (
+    JOB_POLL_INTERVAL,
+    JOB_RETRY_BACKOFF,
+    JOB_RETRY_BACKOFF_MAX,
+    JOB_LOCK_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+# Candidates tried per claim when the database cannot skip locked rows
+CLAIM_CANDIDATES = 10
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claimable(now):
+    # Queued jobs that are due, and running jobs whose worker went away
+    # with attempts left
+    return Job.objects.filter(
+        Q(status="QUEUED", run_at__lte=now)
+        | Q(
+            status="RUNNING",
+            locked_at__lt=now - timedelta(seconds=JOB_LOCK_TIMEOUT),
+            attempts__lt=F("max_attempts"),
+        )
+    ).order_by("run_at")
+
+
+def fail_exhausted(now):
+    # A job that keeps taking its worker down would otherwise run forever
+    return Job.objects.filter(
+        status="RUNNING",
+        locked_at__lt=now - timedelta(seconds=JOB_LOCK_TIMEOUT),
+        attempts__gte=F("max_attempts"),
+    ).update(
+        status="FAILED", error="Worker went away on the last attempt", updated_at=now
+    )
+
+
+def claim_job(worker):
+    """
+    Lock the next due job to this worker. Where the database can skip
+    locked rows concurrent workers each take a different row without
+    waiting. SQLite has no row locks, so there a job is claimed with a
+    conditional UPDATE and only the worker whose UPDATE matched runs it.
+    """
+    now = timezone.now()
+    claim = {
+        "status": "RUNNING",
+        "locked_by": worker,
+        "locked_at": now,
+        "attempts": F("attempts") + 1,
+        "updated_at": now,
+    }
+    fail_exhausted(now)
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job_id = (
+                claimable(now)
+                .select_for_update(skip_locked=True)
+                .values_list("id", flat=True)
+                .first()
+            )
+            if job_id is None:
+                return None
+            Job.objects.filter(id=job_id).update(**claim)
+    else:
+        candidates = claimable(now).values_list("id", "status", "locked_at")
+        for job_id, status, locked_at in candidates[:CLAIM_CANDIDATES]:
+            if Job.objects.filter(
+                id=job_id, status=status, locked_at=locked_at
+            ).update(**claim):
+                break
+        else:
+            return None
+    return Job.objects.get(id=job_id)
+
+
+def retry_delay(attempts):
+    # Exponential backoff capped at JOB_RETRY_BACKOFF_MAX, jittered so retries
+    # of jobs that failed together spread out
+    delay = min(JOB_RETRY_BACKOFF * 2 ** (attempts - 1), JOB_RETRY_BACKOFF_MAX)
+    return random.uniform(delay / 2, delay)
+
+
+def run_job(job, worker):
+    """
+    Run a claimed job and record how it went. A failed job is queued again
+    after a backoff until it runs out of attempts. The result is only
+    written while the job is still locked to this worker.
+    """
+    mine = Job.objects.filter(id=job.id, locked_by=worker, status="RUNNING")
+
+    def finish(**fields):
+        return mine.update(updated_at=timezone.now(), **fields)
+
+    try:
+        fn = registry[job.name]
+    except KeyError:
+        return finish(status="FAILED", error=f"Unknown task {job.name}")
+    try:
+        result = fn(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception("Job %s (%s) failed", job.id, job.name)
+        if job.attempts >= job.max_attempts:
+            return finish(status="FAILED", error=error)
+        run_at = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+        return finish(
+            status="QUEUED", error=error, run_at=run_at, locked_by=None, locked_at=None
+        )
+    return finish(status="DONE", result=result, error="")
+
+
+def run_worker(worker=None, once=False, poll_interval=JOB_POLL_INTERVAL):
+    """
+    Claim and run jobs one at a time, sleeping for poll_interval when none
+    are due. With once it returns as soon as the queue is drained and
+    reports how many jobs it ran.
+    """
+    worker = worker or worker_name()
+    ran = 0
+    while True:
+        close_old_connections()
+        job = claim_job(worker)
+        if job is None:
+            if once:
+                return ran
+            time.sleep(poll_interval)
+            continue
+        run_job(job, worker)
+        ran += 1
@@ -0,0 +1,25 @@
+import uuid
+
+from ninja import ModelSchema
+from typing import Union
+
+from jobs.models import Job
+
+
+class JobOutSchema(ModelSchema):
+    id: Union[str, uuid.UUID]
+
+    class Meta:
+        model = Job
+        fields = [
+            "id",
+            "name",
+            "status",
+            "attempts",
+            "max_attempts",
+            "run_at",
+            "result",
+            "error",
+            "created_at",
+            "updated_at",
+        ]
@@ -0,0 +1,39 @@
+from django.utils import timezone
+
+from jobs.models import Job
+
+registry = {}
+
+
+class UnknownTask(Exception):
+    pass
+
+
+def task(name, max_attempts=5):
+    """
+    Register a function as a job under name. Its keyword arguments come
+    from the job payload, so they must be JSON serializable, and whatever
+    it returns is stored as the job result.
+    """
+
+    def decorator(fn):
+        fn.task_name = name
+        fn.max_attempts = max_attempts
+        registry[name] = fn
+        return fn
+
+    return decorator
+
+
+def enqueue(fn, created_by_id=None, run_at=None, **payload):
+    # Queue a registered task to run at run_at, now by default. Inside a
+    # transaction it is only seen on commit
+    if registry.get(getattr(fn, "task_name", None)) is not fn:
+        raise UnknownTask(f"{fn.__name__} is not a registered task")
+    return Job.objects.create(
+        name=fn.task_name,
+        payload=payload,
+        max_attempts=fn.max_attempts,
+        created_by_id=created_by_id,
+        run_at=run_at or timezone.now(),
+    )
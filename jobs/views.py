@@ -0,0 +1,18 @@
+from ninja import Router
+from typing import Any
+
+from django.shortcuts import get_object_or_404
+
+from jobs.models import Job
+from jobs.schemas import JobOutSchema
+from utils.authentication import AuthBearer
+
+router = Router(auth=AuthBearer())
+
+
+@router.get("/{job_id}", response={200: JobOutSchema, 404: Any})
+def get_job(request, job_id: str):
+    jobs = Job.objects.all()
+    if "Admin" not in request.auth["roles"]:
+        jobs = jobs.filter(created_by_id=request.auth["user"])
+    return 200, get_object_or_404(jobs, id=job_id)
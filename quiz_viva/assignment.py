@@ -0,0 +1,43 @@
+from django.db.models import F
+
+from admin.models import Student
+from quiz_viva.models import StudentQuizOrVivaLink
+
+
+def get_cohort(
+    institution_id, course_id=None, department_id=None, class_or_semester=None
+):
+    """
+    Students of an institution narrowed down by any mix of course,
+    department and semester. A course cohort is every student of its
+    departments who is in the course's semester.
+    """
+    students = Student.objects.filter(
+        user__user_institution_link__institution_id=institution_id,
+        user__user_institution_link__role__name="Student",
+    )
+    if course_id is not None:
+        course_link = "studentdepartmentlink__department__coursedepartmentlink__course"
+        students = students.filter(
+            **{
+                course_link: course_id,
+                "class_or_semester": F(f"{course_link}__class_or_semester"),
+            }
+        )
+    if department_id is not None:
+        students = students.filter(studentdepartmentlink__department_id=department_id)
+    if class_or_semester is not None:
+        students = students.filter(class_or_semester=class_or_semester)
+    return students.values_list("id", flat=True).distinct()
+
+
+def assign_students(quiz_or_viva, student_ids):
+    # One multi-row INSERT, students already assigned are skipped
+    StudentQuizOrVivaLink.objects.bulk_create(
+        [
+            StudentQuizOrVivaLink(student_id=student_id, quiz_or_viva=quiz_or_viva)
+            for student_id in student_ids
+        ],
+        ignore_conflicts=True,
+        batch_size=500,
+    )
@@ -0,0 +1,98 @@
+from django.db import transaction
+
+from admin.models import Module
+from quiz_viva.models import QuestionBank, Question, Options
+from quiz_viva.paper import bump_qbank_version
+
+QUESTION_TYPES = {value for value, _ in Question.TYPE_CHOICES}
+OPTION_NUMBERS = {value for value, _ in Options.OPTION_CHOICES}
+QUESTION_LENGTH = Question._meta.get_field("question").max_length
+OPTION_LENGTH = Options._meta.get_field("option").max_length
+# Largest value a PositiveIntegerField holds on every supported database
+POSITIVE_INTEGER_MAX = 2147483647
+
+
+def is_count(value):
+    # A whole number that fits a PositiveIntegerField
+    return (
+        isinstance(value, int)
+        and not isinstance(value, bool)
+        and 0 <= value <= POSITIVE_INTEGER_MAX
+    )
+
+
+def validate_questions(questions, creator_id):
+    """
+    Check a batch of question dicts, shaped like QuestionInSchema, with one
+    IN query for the qbanks and one for the modules. Returns a list of
+    {"index", "message"} errors, empty when the whole batch is valid.
+    """
+    qbank_ids = set(
+        QuestionBank.objects.filter(
+            id__in={question["qbank_id"] for question in questions},
+            creator_id=creator_id,
+        ).values_list("id", flat=True)
+    )
+    module_ids = set(
+        Module.objects.filter(
+            id__in={question["module_id"] for question in questions}
+        ).values_list("id", flat=True)
+    )
+    errors = []
+    for index, question in enumerate(questions):
+        if question["qbank_id"] not in qbank_ids:
+            message = "Question bank not found"
+        elif question["module_id"] not in module_ids:
+            message = "Module not found"
+        elif question["question_type"] not in QUESTION_TYPES:
+            message = "Invalid question type"
+        elif len(question["question"]) > QUESTION_LENGTH:
+            message = "Question is too long"
+        elif not is_count(question.get("marks", 1)):
+            message = "Marks must be a whole number of at least 0"
+        elif not is_count(question.get("weight", 1)):
+            message = "Weight must be a whole number of at least 0"
+        elif not question["options"]:
+            message = "Question has no options"
+        elif any(
+            option["option_number"] not in OPTION_NUMBERS
+            for option in question["options"]
+        ):
+            message = "Invalid option number"
+        elif any(
+            len(option["option"]) > OPTION_LENGTH for option in question["options"]
+        ):
+            message = "Option is too long"
+        else:
+            continue
+        errors.append({"index": index, "message": message})
+    return errors
+
+
+@transaction.atomic
+def insert_questions(questions):
+    """
+    Insert a validated batch of questions and their options with one
+    bulk_create each, all or nothing, and bump the touched qbanks.
+    """
+    question_rows = []
+    option_rows = []
+    for question in questions:
+        question_row = Question(
+            question_number=question["question_number"],
+            question=question["question"],
+            question_type=question["question_type"],
+            marks=question.get("marks", 1),
+            weight=question.get("weight", 1),
+            qbank_id=question["qbank_id"],
+            module_id=question["module_id"],
+        )
+        question_rows.append(question_row)
+        option_rows.extend(
+            Options(question=question_row, **option) for option in question["options"]
+        )
+    Question.objects.bulk_create(question_rows)
+    Options.objects.bulk_create(option_rows)
+    for qbank_id in {question["qbank_id"] for question in questions}:
+        bump_qbank_version(qbank_id)
+    return len(question_rows)
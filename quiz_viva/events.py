@@ -0,0 +1,115 @@
+import json
+import time
+import asyncio
+import threading
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+
+from quiz_viva.ticket import (
+    InvalidExamTicket,
+    decode_exam_ticket,
+    refresh_expired_claims,
+)
+from quizverse_backend.settings import EXAM_EVENTS_HEARTBEAT
+
+
+class Broadcaster:
+    """
+    Fans events out to every event stream of a quiz open in this process.
+    Publishing is safe from the sync views, which run in worker threads,
+    while each stream waits on its own queue in the event loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Subscribers keyed by quiz id, each a (loop, queue) pair
+        self._channels = {}
+
+    def subscribe(self, quiz_or_viva_id):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._channels.setdefault(quiz_or_viva_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, quiz_or_viva_id, subscriber):
+        with self._lock:
+            subscribers = self._channels.get(quiz_or_viva_id, set())
+            subscribers.discard(subscriber)
+            if not subscribers:
+                self._channels.pop(quiz_or_viva_id, None)
+
+    def publish(self, quiz_or_viva_id, event, data=None):
+        with self._lock:
+            subscribers = list(self._channels.get(str(quiz_or_viva_id), ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, (event, data or {}))
+            except RuntimeError:
+                # The stream's loop has shut down, it unsubscribes itself
+                pass
+        return len(subscribers)
+
+
+broadcaster = Broadcaster()
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_events(exam):
+    """
+    Events for one student's exam. Extensions and a forced end apply to
+    the whole quiz, a malpractice lock only to the link it names.
+    """
+    deadline = exam["exp"]
+    subscriber = broadcaster.subscribe(exam["quiz"])
+    try:
+        yield format_event("clock", {"now": time.time()})
+        yield format_event("deadline", {"deadline": deadline})
+        while True:
+            if (remaining := deadline - time.time()) <= 0:
+                yield format_event("end", {"reason": "deadline"})
+                return
+            try:
+                event, data = await asyncio.wait_for(
+                    subscriber[1].get(), min(EXAM_EVENTS_HEARTBEAT, remaining)
+                )
+            except asyncio.TimeoutError:
+                yield format_event("clock", {"now": time.time()})
+                continue
+            if data.get("link", exam["link"]) != exam["link"]:
+                continue
+            yield format_event(event, data)
+            if event == "extend":
+                deadline += data["minutes"] * 60
+                yield format_event("deadline", {"deadline": deadline})
+            elif event in ("end", "malpractice"):
+                return
+    finally:
+        broadcaster.unsubscribe(exam["quiz"], subscriber)
+
+
+async def exam_events(request):
+    # EventSource cannot send headers, so the exam ticket comes as a query
+    # parameter and stands in for the access token as well
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {"message": "Exam events are only served over ASGI"}, status=501
+        )
+    try:
+        exam = decode_exam_ticket(
+            request.GET.get("ticket", ""), request.GET.get("quiz_or_viva_id")
+        )
+    except InvalidExamTicket:
+        return JsonResponse({"detail": "Invalid exam ticket supplied"}, status=401)
+    # A stream reopened with a ticket issued before an extension
+    exam = await sync_to_async(refresh_expired_claims)(exam)
+    response = StreamingHttpResponse(
+        stream_events(exam), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
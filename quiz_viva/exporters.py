@@ -0,0 +1,90 @@
+import csv
+import json
+
+from django.db.models import Prefetch
+
+from quiz_viva.models import Question, Options
+from quiz_viva.importers import OPTION_LETTERS
+from utils.utils import Echo
+
+EXPORT_CHUNK_SIZE = 500
+CSV_COLUMNS = [
+    "question_number",
+    "question",
+    "question_type",
+    "module_id",
+    "marks",
+    "weight",
+    "correct",
+    *OPTION_LETTERS,
+]
+
+
+def iter_questions(qbank_id):
+    """
+    Questions of a bank with their options, answers included, fetched
+    EXPORT_CHUNK_SIZE at a time so memory stays flat however large it is.
+    """
+    questions = (
+        Question.objects.filter(qbank_id=qbank_id)
+        .order_by("question_number")
+        .prefetch_related(
+            Prefetch("options_set", queryset=Options.objects.order_by("option_number"))
+        )
+    )
+    for question in questions.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {
+            "question_number": question.question_number,
+            "question": question.question,
+            "question_type": question.question_type,
+            "module_id": question.module_id,
+            "marks": question.marks,
+            "weight": question.weight,
+            "options": [
+                {
+                    "option_number": option.option_number,
+                    "option": option.option,
+                    "is_correct": option.is_correct,
+                }
+                for option in question.options_set.all()
+            ],
+        }
+
+
+def export_jsonl(qbank_id):
+    # Same shape read_jsonl imports
+    for question in iter_questions(qbank_id):
+        yield json.dumps(question) + "\n"
+
+
+def export_csv(qbank_id):
+    # Same columns read_csv imports
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for question in iter_questions(qbank_id):
+        options = {option["option_number"]: option for option in question["options"]}
+        yield writer.writerow(
+            [
+                question["question_number"],
+                question["question"],
+                question["question_type"],
+                question["module_id"],
+                question["marks"],
+                question["weight"],
+                ";".join(
+                    letter
+                    for letter in OPTION_LETTERS
+                    if letter in options and options[letter]["is_correct"]
+                ),
+                *(
+                    options[letter]["option"] if letter in options else ""
+                    for letter in OPTION_LETTERS
+                ),
+            ]
+        )
+
+
+EXPORTERS = {
+    "jsonl": (export_jsonl, "application/x-ndjson"),
+    "csv": (export_csv, "text/csv"),
+}
@@ -0,0 +1,167 @@
+import hashlib
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from quiz_viva.paper import get_paper
+from quiz_viva.sampling import sample_questions
+from quiz_viva.models import (
+    Question,
+    QuestionBank,
+    QuizOrViva,
+    StudentQuizOrVivaLink,
+    StudentResponse,
+)
+
+
+def freeze_questions(quiz_or_viva):
+    """
+    Record the qbank version and the marks of each of its questions on the
+    quiz. Serving, response checks and grading read these from then on, so
+    questions added to the bank later never reach the quiz.
+    """
+    with transaction.atomic():
+        # Locking the bank keeps an insert from landing between the reads
+        qbank = QuestionBank.objects.select_for_update().get(
+            id=quiz_or_viva.qbank_id
+        )
+        quiz_or_viva.qbank_version = qbank.version
+        quiz_or_viva.question_marks = {
+            str(question_id): marks
+            for question_id, marks in Question.objects.filter(
+                qbank_id=qbank.id
+            ).values_list("id", "marks")
+        }
+        quiz_or_viva.save(update_fields=["qbank_version", "question_marks"])
+
+
+def publish_quiz(quiz_or_viva, refreeze=True):
+    """
+    Freeze the questions of the quiz's qbank onto the quiz and their count
+    and marks onto the quiz and its student links so that results never
+    have to aggregate them. A quiz with a module_quota freezes each
+    student's own draw instead, the quiz itself keeping the largest total.
+    Without refreeze a published quiz keeps its questions and only its
+    links are brought up to date.
+    """
+    if refreeze or quiz_or_viva.qbank_version is None:
+        freeze_questions(quiz_or_viva)
+    question_marks = quiz_or_viva.question_marks
+    student_quiz_or_viva_links = StudentQuizOrVivaLink.objects.filter(
+        quiz_or_viva_id=quiz_or_viva.id
+    )
+    if quiz_or_viva.module_quota:
+        paper = get_paper(
+            quiz_or_viva.qbank_id, quiz_or_viva.qbank_version, quiz_or_viva.id
+        )
+        links = list(student_quiz_or_viva_links.only("id"))
+        for link in links:
+            questions = sample_questions(
+                paper, quiz_or_viva.module_quota, quiz_or_viva.id, link.id
+            )
+            link.total_marks = sum(
+                question_marks[paper.question_ids[i]] for i in questions
+            )
+        StudentQuizOrVivaLink.objects.bulk_update(
+            links, ["total_marks"], batch_size=500
+        )
+        quiz_or_viva.question_count = paper.pool.count(quiz_or_viva.module_quota)
+        quiz_or_viva.total_marks = max(
+            (link.total_marks for link in links), default=0
+        )
+    else:
+        quiz_or_viva.question_count = len(question_marks)
+        quiz_or_viva.total_marks = sum(question_marks.values())
+        student_quiz_or_viva_links.update(total_marks=quiz_or_viva.total_marks)
+    quiz_or_viva.published_at = timezone.now()
+    quiz_or_viva.save(
+        update_fields=[
+            "question_count",
+            "total_marks",
+            "published_at",
+        ]
+    )
+    stagger_starts(quiz_or_viva)
+    return quiz_or_viva
+
+
+def stagger_starts(quiz_or_viva):
+    """
+    Spread the earliest start of each student over the quiz's start_window
+    so they do not all hit the server at start_time. The offset is derived
+    from the link id, which keeps it stable when the quiz is republished.
+    """
+    student_quiz_or_viva_links = StudentQuizOrVivaLink.objects.filter(
+        quiz_or_viva_id=quiz_or_viva.id
+    )
+    if quiz_or_viva.start_window <= 0:
+        student_quiz_or_viva_links.update(start_after=None)
+        return
+    links = list(student_quiz_or_viva_links.only("id"))
+    for link in links:
+        offset = int(hashlib.sha256(str(link.id).encode()).hexdigest(), 16)
+        link.start_after = quiz_or_viva.start_time + timedelta(
+            seconds=offset % quiz_or_viva.start_window
+        )
+    StudentQuizOrVivaLink.objects.bulk_update(links, ["start_after"], batch_size=500)
+
+
+def grade(quiz_or_viva, student_quiz_or_viva_links):
+    """
+    Recompute marks_obtained for every link of the quiz in the queryset,
+    summing the frozen marks of the questions answered with a correct
+    option. Returns the number of links graded.
+    """
+    question_marks = quiz_or_viva.question_marks
+    marks_obtained = dict.fromkeys(
+        student_quiz_or_viva_links.values_list("id", flat=True), 0
+    )
+    correct = StudentResponse.objects.filter(
+        student_quiz_or_viva_link_id__in=list(marks_obtained),
+        option__is_correct=True,
+        option__question_id=F("question_id"),
+    ).values_list("student_quiz_or_viva_link_id", "question_id")
+    for link_id, question_id in correct.iterator(chunk_size=2000):
+        marks_obtained[link_id] += question_marks.get(str(question_id), 0)
+    StudentQuizOrVivaLink.objects.bulk_update(
+        [
+            StudentQuizOrVivaLink(id=link_id, marks_obtained=marks)
+            for link_id, marks in marks_obtained.items()
+        ],
+        ["marks_obtained"],
+        batch_size=500,
+    )
+    return len(marks_obtained)
+
+
+def grade_link(student_quiz_or_viva_link_id):
+    student_quiz_or_viva_link = StudentQuizOrVivaLink.objects.select_related(
+        "quiz_or_viva"
+    ).get(id=student_quiz_or_viva_link_id)
+    return grade(
+        student_quiz_or_viva_link.quiz_or_viva,
+        StudentQuizOrVivaLink.objects.filter(id=student_quiz_or_viva_link_id),
+    )
+
+
+def grade_quiz(quiz_or_viva_id):
+    quiz_or_viva = QuizOrViva.objects.get(id=quiz_or_viva_id)
+    graded = grade(
+        quiz_or_viva,
+        StudentQuizOrVivaLink.objects.filter(quiz_or_viva_id=quiz_or_viva_id),
+    )
+    QuizOrViva.objects.filter(id=quiz_or_viva_id).update(graded_at=timezone.now())
+    return graded
+
+
+def grade_closed_quizzes():
+    # Quizzes that ended since they were last graded
+    quiz_or_viva_ids = QuizOrViva.objects.filter(
+        end_time__lte=timezone.now()
+    ).exclude(graded_at__gte=F("end_time")).values_list("id", flat=True)
+    return {
+        quiz_or_viva_id: grade_quiz(quiz_or_viva_id)
+        for quiz_or_viva_id in quiz_or_viva_ids
+    }
@@ -0,0 +1,208 @@
+import csv
+import json
+import codecs
+from itertools import islice
+from xml.etree import ElementTree
+
+from django.utils.html import strip_tags
+
+from quiz_viva.authoring import insert_questions, validate_questions
+
+IMPORT_FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".xml": "xml"}
+IMPORT_CHUNK_SIZE = 500
+# Beyond this only the number of failed rows is reported
+MAX_REPORTED_ERRORS = 1000
+OPTION_LETTERS = ["A", "B", "C", "D", "E"]
+
+
+class RowError(Exception):
+    pass
+
+
+def read_csv(upload):
+    """
+    One question per row with the columns question_number, question,
+    question_type, module_id, marks, weight, correct and A to E, where
+    correct lists the right option letters separated by semicolons.
+    """
+    for row in csv.DictReader(codecs.iterdecode(upload, "utf-8-sig")):
+        correct = {
+            letter.strip().upper() for letter in (row.get("correct") or "").split(";")
+        }
+        yield {
+            "question_number": row.get("question_number"),
+            "question": row.get("question") or "",
+            "question_type": row.get("question_type") or "MCQ",
+            "module_id": row.get("module_id"),
+            "marks": row.get("marks"),
+            "weight": row.get("weight"),
+            "options": [
+                {
+                    "option_number": letter,
+                    "option": row[letter],
+                    "is_correct": letter in correct,
+                }
+                for letter in OPTION_LETTERS
+                if row.get(letter)
+            ],
+        }
+
+
+def read_jsonl(upload):
+    # One QuestionInSchema shaped object per line, qbank_id is not needed
+    for line in upload:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield RowError("Invalid JSON")
+
+
+def is_correct_fraction(fraction):
+    try:
+        return float(fraction) > 0
+    except (TypeError, ValueError):
+        return False
+
+
+def read_moodle_xml(upload):
+    """
+    Multiple choice and true/false questions of a Moodle XML export. The
+    tree is cleared after every question so memory stays flat.
+    """
+    events = ElementTree.iterparse(upload, events=("start", "end"))
+    _, root = next(events)
+    for event, element in events:
+        if event != "end" or element.tag != "question":
+            continue
+        question_type = element.get("type")
+        if question_type == "category":
+            pass
+        elif question_type not in ("multichoice", "truefalse"):
+            yield RowError(f"Unsupported Moodle question type {question_type}")
+        else:
+            text = element.findtext("questiontext/text") or ""
+            answers = element.findall("answer")
+            yield {
+                "question": strip_tags(text).strip(),
+                "question_type": "MCQ",
+                "marks": element.findtext("defaultgrade"),
+                "options": [
+                    {
+                        "option_number": letter,
+                        "option": strip_tags(answer.findtext("text", "")).strip(),
+                        "is_correct": is_correct_fraction(answer.get("fraction")),
+                    }
+                    for letter, answer in zip(OPTION_LETTERS, answers)
+                ],
+            }
+        root.clear()
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl, "xml": read_moodle_xml}
+
+
+def scalar(value):
+    # JSON rows can nest anything, a field must hold a single value
+    if isinstance(value, (dict, list)):
+        raise RowError("Invalid field values")
+    return value
+
+
+def text(value):
+    return None if (value := scalar(value)) is None else str(value)
+
+
+def given(value, default):
+    # Only a missing or blank field takes the default, 0 is a value
+    return default if value is None or value == "" else value
+
+
+def boolean(value):
+    # Real booleans, 0 and 1 or the strings true and false, as bool("false")
+    # would silently turn a wrong option into a right one
+    if isinstance(value, str):
+        value = value.strip().lower()
+    try:
+        return {True: True, False: False, "true": True, "false": False}[value]
+    except (KeyError, TypeError):
+        raise RowError("is_correct must be true or false")
+
+
+def normalize(row, qbank_id, module_id, question_number):
+    # Turn a parsed row into the dict validate_questions expects
+    if isinstance(row, RowError):
+        raise row
+    if not isinstance(row, dict):
+        raise RowError("Row is not an object")
+    if not isinstance(options := row.get("options") or [], list):
+        raise RowError("Options must be a list")
+    try:
+        return {
+            "qbank_id": str(qbank_id),
+            "module_id": text(row.get("module_id") or module_id),
+            "question_number": int(
+                scalar(row.get("question_number") or question_number)
+            ),
+            "question": text(row.get("question") or ""),
+            "question_type": text(row.get("question_type") or "MCQ"),
+            "marks": int(float(scalar(given(row.get("marks"), 1)))),
+            "weight": int(scalar(given(row.get("weight"), 1))),
+            "options": [
+                {
+                    "option_number": text(option["option_number"]),
+                    "option": str(scalar(option["option"])),
+                    "is_correct": boolean(option.get("is_correct", False)),
+                }
+                for option in options
+            ],
+        }
+    except (KeyError, TypeError, ValueError, OverflowError, AttributeError):
+        raise RowError("Invalid field values")
+
+
+def import_questions(
+    upload, file_format, qbank_id, module_id, first_number, creator_id
+):
+    """
+    Stream the upload through the reader for its format, validating and
+    inserting IMPORT_CHUNK_SIZE questions at a time. Rows are numbered from
+    1 and questions without a number continue from first_number. Each
+    chunk is written atomically, bad rows are skipped and reported.
+    """
+    report = {"created": 0, "failed": 0, "errors": []}
+
+    def fail(row_number, message):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"row": row_number, "message": message})
+
+    rows = enumerate(READERS[file_format](upload), start=1)
+    question_number = first_number
+    try:
+        while chunk := list(islice(rows, IMPORT_CHUNK_SIZE)):
+            numbers = []
+            questions = []
+            for row_number, row in chunk:
+                try:
+                    question = normalize(row, qbank_id, module_id, question_number)
+                except RowError as exc:
+                    fail(row_number, str(exc))
+                    continue
+                question_number = question["question_number"] + 1
+                numbers.append(row_number)
+                questions.append(question)
+            if not questions:
+                continue
+            failed = set()
+            for error in validate_questions(questions, creator_id):
+                failed.add(error["index"])
+                fail(numbers[error["index"]], error["message"])
+            if valid := [q for i, q in enumerate(questions) if i not in failed]:
+                report["created"] += insert_questions(valid)
+    except (csv.Error, ElementTree.ParseError, UnicodeDecodeError) as exc:
+        # The rest of the file cannot be read, what was imported stays
+        fail(None, f"File could not be read further: {exc}")
+    report["errors"].sort(key=lambda error: (error["row"] is None, error["row"]))
+    return report
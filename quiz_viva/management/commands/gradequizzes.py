@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from quiz_viva.grading import grade_closed_quizzes, grade_quiz
+
+
+class Command(BaseCommand):
+    help = "Grade every quiz that has ended since it was last graded."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--quiz",
+            dest="quiz_or_viva_id",
+            default=None,
+            help="Grade only this quiz, whether or not it has ended.",
+        )
+
+    def handle(self, *args, **options):
+        if quiz_or_viva_id := options.get("quiz_or_viva_id"):
+            graded = {quiz_or_viva_id: grade_quiz(quiz_or_viva_id)}
+        else:
+            graded = grade_closed_quizzes()
+        for quiz_or_viva_id, count in graded.items():
+            self.stdout.write(f"Graded {count} students of {quiz_or_viva_id}")
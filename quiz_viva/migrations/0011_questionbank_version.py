@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("quiz_viva", "0010_alter_studentquizorvivalink_student"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="questionbank",
+            name="version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("quiz_viva", "0011_questionbank_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="question",
+            name="marks",
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name="quizorviva",
+            name="graded_at",
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("quiz_viva", "0012_question_marks_quizorviva_graded_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="quizorviva",
+            name="published_at",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name="quizorviva",
+            name="question_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="quizorviva",
+            name="question_marks",
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AddField(
+            model_name="quizorviva",
+            name="total_marks",
+            field=models.IntegerField(default=0),
+        ),
+    ]
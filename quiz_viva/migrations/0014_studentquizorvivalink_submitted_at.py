@@ -0,0 +1,20 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        (
+            "quiz_viva",
+            "0013_quizorviva_published_at_quizorviva_question_count_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="studentquizorvivalink",
+            name="submitted_at",
+            field=models.DateTimeField(null=True),
+        ),
+    ]
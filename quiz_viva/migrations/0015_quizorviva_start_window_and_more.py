@@ -0,0 +1,22 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("quiz_viva", "0014_studentquizorvivalink_submitted_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="quizorviva",
+            name="start_window",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="studentquizorvivalink",
+            name="start_after",
+            field=models.DateTimeField(null=True),
+        ),
+    ]
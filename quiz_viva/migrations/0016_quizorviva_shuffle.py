@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("quiz_viva", "0015_quizorviva_start_window_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="quizorviva",
+            name="shuffle",
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("quiz_viva", "0016_quizorviva_shuffle"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="question",
+            name="weight",
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name="quizorviva",
+            name="module_quota",
+            field=models.JSONField(default=dict),
+        ),
+    ]
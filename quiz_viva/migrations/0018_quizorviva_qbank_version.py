@@ -0,0 +1,48 @@
+# Generated by Django 5.0.1 on 2026-10-18 19:08
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def freeze_questions(apps, schema_editor):
+    # Every quiz is frozen at the current version of its bank here, so the
+    # exam endpoints never have to publish one on first use
+    QuizOrViva = apps.get_model("quiz_viva", "QuizOrViva")
+    Question = apps.get_model("quiz_viva", "Question")
+    StudentQuizOrVivaLink = apps.get_model("quiz_viva", "StudentQuizOrVivaLink")
+    now = timezone.now()
+    for quiz_or_viva in QuizOrViva.objects.select_related("qbank"):
+        quiz_or_viva.qbank_version = quiz_or_viva.qbank.version
+        quiz_or_viva.question_marks = {
+            str(question_id): marks
+            for question_id, marks in Question.objects.filter(
+                qbank_id=quiz_or_viva.qbank_id
+            ).values_list("id", "marks")
+        }
+        update_fields = ["qbank_version", "question_marks"]
+        if quiz_or_viva.published_at is None:
+            # Never published, so it predates module_quota and every student
+            # gets the whole bank
+            quiz_or_viva.question_count = len(quiz_or_viva.question_marks)
+            quiz_or_viva.total_marks = sum(quiz_or_viva.question_marks.values())
+            quiz_or_viva.published_at = now
+            update_fields += ["question_count", "total_marks", "published_at"]
+            StudentQuizOrVivaLink.objects.filter(
+                quiz_or_viva_id=quiz_or_viva.id
+            ).update(total_marks=quiz_or_viva.total_marks)
+        quiz_or_viva.save(update_fields=update_fields)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("quiz_viva", "0017_question_weight_quizorviva_module_quota"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="quizorviva",
+            name="qbank_version",
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.RunPython(freeze_questions, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 import uuid
 from django.db import models
+from django.db.models import Q
 from django.utils import timezone
 
 # Create your models here
@@ -15,6 +16,19 @@ class QuizOrViva(models.Model):
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
     duration = models.IntegerField()
+    # Seconds over which student starts are spread after start_time
+    start_window = models.IntegerField(default=0)
+    # Give every student their own question and option order
+    shuffle = models.BooleanField(default=False)
+    # Questions drawn per module id, empty uses every question in the qbank
+    module_quota = models.JSONField(default=dict)
+    # Frozen from the qbank when the quiz is published, see quiz_viva.grading
+    question_count = models.IntegerField(default=0)
+    question_marks = models.JSONField(default=dict)
+    qbank_version = models.PositiveIntegerField(null=True)
+    total_marks = models.IntegerField(default=0)
+    published_at = models.DateTimeField(null=True)
+    graded_at = models.DateTimeField(null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -30,6 +44,35 @@ class QuizOrViva(models.Model):
         else:
             return "COMPLETED"
 
+class StudentQuizOrVivaLinkQuerySet(models.QuerySet):
+    """
+    Exam state transitions as conditional single statement UPDATEs. Each
+    returns the number of links that changed state, so a duplicate or
+    out of window request simply changes nothing.
+    """
+
+    def start(self, now=None):
+        now = now or timezone.now()
+        return (
+            self.filter(
+                start_time__isnull=True,
+                malpractice=False,
+                quiz_or_viva__start_time__lte=now,
+                quiz_or_viva__end_time__gt=now,
+            )
+            .filter(Q(start_after__isnull=True) | Q(start_after__lte=now))
+            .update(start_time=now)
+        )
+
+    def submit(self, now=None):
+        return self.filter(
+            start_time__isnull=False, submitted_at__isnull=True
+        ).update(submitted_at=now or timezone.now())
+
+    def flag_malpractice(self):
+        return self.filter(malpractice=False).update(malpractice=True)
+
+
 class StudentQuizOrVivaLink(models.Model):
     id = models.CharField(primary_key=True, max_length=36, default=uuid.uuid4)
     student = models.ForeignKey("admin.Student", on_delete=models.CASCADE)
@@ -37,10 +80,15 @@ class StudentQuizOrVivaLink(models.Model):
     total_marks = models.IntegerField(default=0)
     marks_obtained = models.IntegerField(default=0)
     start_time = models.DateTimeField(null=True)
+    # Earliest start for this student when the quiz has a start_window
+    start_after = models.DateTimeField(null=True)
+    submitted_at = models.DateTimeField(null=True)
     malpractice = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = StudentQuizOrVivaLinkQuerySet.as_manager()
+
     class Meta:
         db_table = "student_quiz_or_viva_link"
         constraints = [
@@ -85,6 +133,8 @@ class QuestionBank(models.Model):
     id = models.CharField(primary_key=True, max_length=36, default=uuid.uuid4)
     title = models.CharField(max_length=50)
     creator = models.ForeignKey("users.User", on_delete=models.CASCADE)
+    # Bumped on every edit to the bank's questions, see quiz_viva.paper
+    version = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -115,6 +165,9 @@ class Question(models.Model):
     question_number = models.IntegerField()
     question = models.CharField(max_length=500)
     question_type = models.CharField(max_length=6, choices=TYPE_CHOICES)
+    marks = models.PositiveIntegerField(default=1)
+    # Relative chance of being drawn by a module_quota quiz, 0 never
+    weight = models.PositiveIntegerField(default=1)
     qbank = models.ForeignKey("QuestionBank", on_delete=models.CASCADE)
     module = models.ForeignKey("admin.Module", on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
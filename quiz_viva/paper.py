@@ -0,0 +1,149 @@
+import json
+
+from django.db.models import F, Prefetch
+from ninja.responses import NinjaJSONEncoder
+
+from quiz_viva.models import QuestionBank, Question, Options, QuizOrViva
+from quiz_viva.schemas import PaperQuestionOutSchema, OptionOutSchema
+from quiz_viva.sampling import QuestionPool
+from utils.cache import LRUCache
+from utils.singleflight import group
+from quizverse_backend.settings import PAPER_CACHE_SIZE, PAPER_CACHE_TTL
+
+# Serialized papers keyed by (qbank id, qbank version, quiz id). Every change
+# to a bank bumps its version, and each quiz keeps its own paper as quizzes
+# frozen at the same version may still hold different questions.
+paper_cache = LRUCache(maxsize=PAPER_CACHE_SIZE, ttl=PAPER_CACHE_TTL)
+
+
+class Paper:
+    """
+    The questions of a question bank and their options, without the
+    answer key, serialized once and shared by every student of a quiz.
+    Each question and option is also kept as its own JSON fragment so a
+    student's shuffled paper is assembled by joining bytes, see
+    quiz_viva.shuffle.
+    """
+
+    def __init__(
+        self,
+        question_ids,
+        question_fragments,
+        option_fragments,
+        question_modules,
+        question_weights,
+    ):
+        # Question ids ordered by question_number
+        self.question_ids = question_ids
+        # JSON object of each question, in the same order, without options
+        self.question_fragments = question_fragments
+        # JSON objects of the options of each question keyed by question id
+        self.option_fragments = option_fragments
+        # Per-module index arrays for quizzes drawing from the bank
+        self.pool = QuestionPool(question_modules, question_weights)
+        # Valid option ids keyed by question id, for checking responses
+        self.option_ids = {
+            question_id: {json.loads(option)["id"] for option in options}
+            for question_id, options in option_fragments.items()
+        }
+        # JSON list of questions with their options embedded
+        self.content = self.render(range(len(question_ids)))
+        # JSON list of questions ordered by question_number
+        self.questions = join_fragments(question_fragments)
+        # JSON list of options keyed by question id
+        self.options = {
+            question_id: join_fragments(options)
+            for question_id, options in option_fragments.items()
+        }
+
+    def render(self, question_order, option_order=None):
+        # Paper with questions in question_order, a list of indexes, and the
+        # options of each question in option_order(question_id) if given
+        questions = []
+        for index in question_order:
+            question_id = self.question_ids[index]
+            options = self.option_fragments[question_id]
+            if option_order is not None:
+                options = [options[i] for i in option_order(question_id)]
+            # Swap the trailing null options of the fragment for the list
+            questions.append(
+                self.question_fragments[index][: -len(b"null}")]
+                + join_fragments(options)
+                + b"}"
+            )
+        return join_fragments(questions)
+
+    def render_questions(self, question_order):
+        return join_fragments([self.question_fragments[i] for i in question_order])
+
+    def render_options(self, question_id, option_order=None):
+        if option_order is None:
+            return self.options.get(question_id, b"[]")
+        options = self.option_fragments.get(question_id, [])
+        return join_fragments([options[i] for i in option_order])
+
+
+def _dumps(data):
+    return json.dumps(data, cls=NinjaJSONEncoder).encode()
+
+
+def join_fragments(fragments):
+    return b"[" + b", ".join(fragments) + b"]"
+
+
+def build_paper(qbank_id, quiz_or_viva_id=None):
+    questions = Question.objects.filter(qbank_id=qbank_id)
+    if quiz_or_viva_id is not None:
+        # Only the questions frozen onto the quiz when it was published, the
+        # bank may have grown since
+        question_marks = QuizOrViva.objects.values_list(
+            "question_marks", flat=True
+        ).get(id=quiz_or_viva_id)
+        questions = questions.filter(id__in=list(question_marks))
+    questions = (
+        questions.order_by("question_number")
+        .prefetch_related(
+            Prefetch("options_set", queryset=Options.objects.order_by("option_number"))
+        )
+    )
+    question_ids = []
+    question_fragments = []
+    option_fragments = {}
+    question_modules = []
+    question_weights = []
+    for question in questions:
+        question_data = PaperQuestionOutSchema.from_orm(question).dict()
+        # Options goes last so render can splice the option list in
+        question_data.pop("options", None)
+        question_data["options"] = None
+        question_ids.append(str(question.id))
+        question_modules.append(question.module_id)
+        question_weights.append(question.weight)
+        question_fragments.append(_dumps(question_data))
+        option_fragments[str(question.id)] = [
+            _dumps(OptionOutSchema.from_orm(option).dict())
+            for option in question.options_set.all()
+        ]
+    return Paper(
+        question_ids,
+        question_fragments,
+        option_fragments,
+        question_modules,
+        question_weights,
+    )
+
+
+def get_paper(qbank_id, version, quiz_or_viva_id=None):
+    # Pass the quiz to get the paper it was published with
+    key = (str(qbank_id), version, quiz_or_viva_id and str(quiz_or_viva_id))
+    if (paper := paper_cache.get(key)) is None:
+        # Students opening the same exam together build the paper only once
+        paper = group.do(("paper", *key), build_paper, qbank_id, quiz_or_viva_id)
+        paper_cache.set(key, paper)
+    return paper
+
+
+def bump_qbank_version(qbank_id):
+    # Call after editing the questions or options of a bank so that
+    # papers built from the old contents are no longer served
+    QuestionBank.objects.filter(id=qbank_id).update(version=F("version") + 1)
@@ -0,0 +1,124 @@
+import heapq
+import random
+import hashlib
+
+
+def exam_seed(*parts):
+    # Stable across processes and Python versions, unlike hash()
+    digest = hashlib.sha256(":".join(str(part) for part in parts).encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+class AliasTable:
+    """
+    Vose's alias method: after O(n) setup every weighted draw costs one
+    random index and one coin flip, whatever the number of questions.
+    """
+
+    def __init__(self, weights):
+        n = len(weights)
+        total = sum(weights)
+        scaled = [weight * n / total for weight in weights]
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1 - scaled[less]
+            (small if scaled[more] < 1 else large).append(more)
+
+    def draw(self, rng):
+        i = int(rng.random() * len(self.prob))
+        return i if rng.random() < self.prob[i] else self.alias[i]
+
+
+class ModulePool:
+    # Questions of one module as indexes into Paper.question_ids
+    def __init__(self, indexes, weights):
+        self.indexes = indexes
+        self.weights = weights
+        self.uniform = len(set(weights)) <= 1
+        self.alias = None if self.uniform else AliasTable(weights)
+
+    def sample(self, count, rng):
+        n = len(self.indexes)
+        if count >= n:
+            return list(self.indexes)
+        if self.uniform:
+            # Partial Fisher-Yates over a sparse map of the swapped slots,
+            # so the cost depends on count and not on the module size
+            swapped = {}
+            picked = []
+            for i in range(count):
+                j = i + int(rng.random() * (n - i))
+                picked.append(swapped.get(j, j))
+                swapped[j] = swapped.get(i, i)
+        elif count * 2 <= n:
+            # Few draws from many questions, so redrawing a repeat is rare
+            picked = set()
+            while len(picked) < count:
+                picked.add(self.alias.draw(rng))
+        else:
+            # Efraimidis-Spirakis A-Res keeps the count largest u^(1/w) keys
+            picked = heapq.nlargest(
+                count,
+                range(n),
+                key=lambda i: rng.random() ** (1 / self.weights[i]),
+            )
+        return [self.indexes[i] for i in picked]
+
+
+class QuestionPool:
+    """
+    Per-module index arrays of a paper, built once per qbank version along
+    with the paper so drawing a student's questions touches no database.
+    Questions with a weight of 0 are never drawn.
+    """
+
+    def __init__(self, question_modules, question_weights):
+        indexes = {}
+        for index, (module_id, weight) in enumerate(
+            zip(question_modules, question_weights)
+        ):
+            if weight > 0:
+                indexes.setdefault(str(module_id), []).append(index)
+        self.modules = {
+            module_id: ModulePool(
+                module_indexes, [question_weights[i] for i in module_indexes]
+            )
+            for module_id, module_indexes in indexes.items()
+        }
+
+    def count(self, module_quota):
+        # Questions every student gets, short modules give all they have
+        return sum(
+            min(count, len(self.modules[str(module_id)].indexes))
+            for module_id, count in module_quota.items()
+            if str(module_id) in self.modules
+        )
+
+    def sample(self, module_quota, seed):
+        """
+        Indexes of count questions from each module of module_quota, in
+        paper order. The same seed always gives the same questions.
+        """
+        rng = random.Random(seed)
+        picked = []
+        # Sorted so the draws do not depend on the order of the quota keys
+        for module_id, count in sorted(module_quota.items()):
+            if (pool := self.modules.get(str(module_id))) is not None:
+                picked.extend(pool.sample(count, rng))
+        return sorted(picked)
+
+
+def sample_questions(
+    paper, module_quota, quiz_or_viva_id, student_quiz_or_viva_link_id
+):
+    # The student's draw from the bank, reproducible from the quiz and link
+    return paper.pool.sample(
+        module_quota,
+        exam_seed(quiz_or_viva_id, student_quiz_or_viva_link_id, "sample"),
+    )
@@ -1,7 +1,7 @@
 import uuid
 
 from ninja import Schema, ModelSchema
-from typing import List, Union
+from typing import Dict, List, Union
 
 from quiz_viva.models import (
     QuestionBank,
@@ -30,13 +30,23 @@ class OptionOutSchema(ModelSchema):
 
 class QuestionOutSchema(ModelSchema):
     id: Union[str, uuid.UUID]
-    options: List[OptionInSchema] = None
+    options: List[OptionOutSchema] = None
 
     class Meta:
         model = Question
         fields = "__all__"
 
 
+class PaperQuestionOutSchema(ModelSchema):
+    # What students see of a question, marks and weight stay with the faculty
+    id: Union[str, uuid.UUID]
+    options: List[OptionOutSchema] = None
+
+    class Meta:
+        model = Question
+        fields = ["id", "question_number", "question", "question_type"]
+
+
 class QuestionInSchema(ModelSchema):
     qbank_id: str
     module_id: str
@@ -62,13 +72,34 @@ class QBankOutSchema(ModelSchema):
         fields = "__all__"
 
 
+class CohortSchema(Schema):
+    course_id: str = None
+    department_id: str = None
+    class_or_semester: int = None
+
+
 class QuizOrVivaInSchema(ModelSchema):
     qbank_id: str
-    student_id: List[str]
+    student_id: List[str] = []
+    cohort: CohortSchema = None
+    module_quota: Dict[str, int] = {}
 
     class Meta:
         model = QuizOrViva
-        exclude = ["id", "conductor", "qbank", "is_private", "created_at", "updated_at"]
+        exclude = [
+            "id",
+            "conductor",
+            "qbank",
+            "is_private",
+            "question_count",
+            "question_marks",
+            "qbank_version",
+            "total_marks",
+            "published_at",
+            "graded_at",
+            "created_at",
+            "updated_at",
+        ]
 
 
 class QuizOrVivaOutSchema(ModelSchema):
@@ -97,6 +128,26 @@ class StudentResponseInSchema(ModelSchema):
         ]
 
 
+class AssignStudentsSchema(Schema):
+    student_id: List[str] = []
+    cohort: CohortSchema = None
+
+
+class ExtendVivaSchema(Schema):
+    minutes: int
+
+
+class ResponseItemSchema(Schema):
+    question_id: str
+    option_id: str
+
+
+class BatchResponseInSchema(Schema):
+    quiz_or_viva_id: str
+    malpractice: bool = False
+    responses: List[ResponseItemSchema]
+
+
 class StudentResponseOutSchema(ModelSchema):
     id: Union[str, uuid.UUID]
 
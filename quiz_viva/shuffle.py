@@ -0,0 +1,36 @@
+import random
+
+from quiz_viva.sampling import exam_seed
+
+
+def permutation(n, seed):
+    """
+    Fisher-Yates shuffle of range(n). Only Random.random() is used because
+    it is the one part of the random module guaranteed to give the same
+    sequence for a seed on every Python version.
+    """
+    rng = random.Random(seed)
+    order = list(range(n))
+    for i in range(n - 1, 0, -1):
+        j = int(rng.random() * (i + 1))
+        order[i], order[j] = order[j], order[i]
+    return order
+
+
+def shuffle_questions(questions, quiz_or_viva_id, student_quiz_or_viva_link_id):
+    """
+    The student's own ordering of a list of question indexes. Nothing is
+    stored, the same quiz and link always give the same order, so a review
+    or a regrade can rebuild exactly what the student saw.
+    """
+    seed = exam_seed(quiz_or_viva_id, student_quiz_or_viva_link_id)
+    return [questions[i] for i in permutation(len(questions), seed)]
+
+
+def option_order(
+    paper, quiz_or_viva_id, student_quiz_or_viva_link_id, question_id
+):
+    return permutation(
+        len(paper.option_fragments.get(question_id, ())),
+        exam_seed(quiz_or_viva_id, student_quiz_or_viva_link_id, question_id),
+    )
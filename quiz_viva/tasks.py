@@ -0,0 +1,13 @@
+from quiz_viva.models import QuizOrViva
+from quiz_viva.assignment import assign_students
+from quiz_viva.grading import publish_quiz
+from jobs.tasks import task
+
+
+@task("quiz_viva.assign_students")
+def assign_students_task(quiz_or_viva_id, student_ids):
+    # The new links get their totals, the quiz keeps its frozen questions
+    quiz_or_viva = QuizOrViva.objects.get(id=quiz_or_viva_id)
+    assign_students(quiz_or_viva, student_ids)
+    publish_quiz(quiz_or_viva, refreeze=False)
+    return {"count": len(student_ids)}
@@ -1,3 +1,406 @@
-from django.test import TestCase
+import json
+import random
+from datetime import timedelta
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from admin.models import Course, Module, Student
+from quiz_viva.exporters import EXPORTERS
+from quiz_viva.grading import grade_closed_quizzes, grade_quiz, publish_quiz
+from quiz_viva.importers import import_questions
+from quiz_viva.paper import bump_qbank_version, get_paper
+from quiz_viva.sampling import AliasTable, QuestionPool, exam_seed
+from quiz_viva.models import (
+    Options,
+    Question,
+    QuestionBank,
+    QuizOrViva,
+    StudentQuizOrVivaLink,
+    StudentResponse,
+)
+from users.models import User
+
+
+class QuestionBankTestCase(TestCase):
+    def setUp(self):
+        self.faculty = User.objects.create(
+            username="faculty@example.com", email="faculty@example.com"
+        )
+        self.course = Course.objects.create(
+            name="DS", code="CS201", class_or_semester=3
+        )
+        self.module = Module.objects.create(
+            module_number=1, module_name="M1", syllabus="", course=self.course
+        )
+        self.qbank = QuestionBank.objects.create(title="QB", creator=self.faculty)
+
+    def add_question(self, number, marks, weight=1, module=None):
+        question = Question.objects.create(
+            question_number=number,
+            question=f"Question {number}",
+            question_type="MCQ",
+            marks=marks,
+            weight=weight,
+            qbank=self.qbank,
+            module=module or self.module,
+        )
+        for option_number, is_correct in (("A", True), ("B", False)):
+            Options.objects.create(
+                question=question,
+                option_number=option_number,
+                option=option_number,
+                is_correct=is_correct,
+            )
+        bump_qbank_version(self.qbank.id)
+        return question
+
+
+class GradingTests(QuestionBankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.questions = [self.add_question(number, 2) for number in (1, 2)]
+        now = timezone.now()
+        self.quiz = QuizOrViva.objects.create(
+            title="Quiz",
+            viva_or_quiz="QUIZ",
+            conductor=self.faculty,
+            qbank=self.qbank,
+            start_time=now - timedelta(minutes=5),
+            end_time=now + timedelta(hours=1),
+            duration=30,
+        )
+        self.links = []
+        for number in range(2):
+            user = User.objects.create(
+                username=f"student{number}@example.com",
+                email=f"student{number}@example.com",
+            )
+            student = Student.objects.create(
+                roll_number=str(number), class_or_semester=3, user=user
+            )
+            self.links.append(
+                StudentQuizOrVivaLink.objects.create(
+                    student=student, quiz_or_viva=self.quiz, start_time=now
+                )
+            )
+        publish_quiz(self.quiz)
+
+    def answer(self, link, question, option_number):
+        StudentResponse.objects.create(
+            student_quiz_or_viva_link=link,
+            question=question,
+            option=question.options_set.get(option_number=option_number),
+        )
+
+    def marks_obtained(self):
+        return [
+            StudentQuizOrVivaLink.objects.get(id=link.id).marks_obtained
+            for link in self.links
+        ]
+
+    def qbank_version(self):
+        return QuestionBank.objects.get(id=self.qbank.id).version
+
+    def test_publish_freezes_questions_and_totals(self):
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.qbank_version, self.qbank_version())
+        self.assertEqual(
+            self.quiz.question_marks,
+            {str(question.id): 2 for question in self.questions},
+        )
+        self.assertEqual(self.quiz.total_marks, 4)
+        self.assertEqual(
+            set(
+                StudentQuizOrVivaLink.objects.values_list("total_marks", flat=True)
+            ),
+            {4},
+        )
+
+    def test_grade_sums_marks_of_correct_answers(self):
+        self.answer(self.links[0], self.questions[0], "A")
+        self.answer(self.links[0], self.questions[1], "A")
+        self.answer(self.links[1], self.questions[0], "A")
+        self.answer(self.links[1], self.questions[1], "B")
+        self.assertEqual(grade_quiz(self.quiz.id), 2)
+        self.assertEqual(self.marks_obtained(), [4, 2])
+        self.assertIsNotNone(QuizOrViva.objects.get(id=self.quiz.id).graded_at)
+
+    def test_questions_added_after_publish_stay_out_of_the_quiz(self):
+        added = self.add_question(3, 5)
+        self.quiz.refresh_from_db()
+        paper = get_paper(self.qbank.id, self.quiz.qbank_version, self.quiz.id)
+        self.assertNotIn(str(added.id), paper.question_ids)
+        self.assertEqual(len(paper.question_ids), 2)
+        self.answer(self.links[0], self.questions[0], "A")
+        self.answer(self.links[0], added, "A")
+        grade_quiz(self.quiz.id)
+        self.assertEqual(self.marks_obtained(), [2, 0])
+
+    def test_quizzes_on_one_bank_keep_their_own_questions(self):
+        old_version = self.qbank_version()
+        other_quiz = QuizOrViva.objects.create(
+            title="Other quiz",
+            viva_or_quiz="QUIZ",
+            conductor=self.quiz.conductor,
+            qbank=self.qbank,
+            start_time=self.quiz.start_time,
+            end_time=self.quiz.end_time,
+            duration=30,
+        )
+        publish_quiz(other_quiz)
+        added = self.add_question(3, 5)
+        publish_quiz(other_quiz)
+        # A paper of the other quiz built under the old version first
+        other_paper = get_paper(self.qbank.id, old_version, other_quiz.id)
+        self.assertIn(str(added.id), other_paper.question_ids)
+        paper = get_paper(self.qbank.id, old_version, self.quiz.id)
+        self.assertNotIn(str(added.id), paper.question_ids)
+
+    def test_paper_shows_students_no_marks_weights_or_answers(self):
+        paper = get_paper(self.qbank.id, self.qbank_version(), self.quiz.id)
+        question = json.loads(paper.content)[0]
+        self.assertEqual(
+            set(question),
+            {"id", "question_number", "question", "question_type", "options"},
+        )
+        self.assertNotIn("is_correct", question["options"][0])
+
+    def test_marks_edited_after_publish_do_not_count(self):
+        Question.objects.filter(id=self.questions[0].id).update(marks=50)
+        self.answer(self.links[0], self.questions[0], "A")
+        grade_quiz(self.quiz.id)
+        self.assertEqual(self.marks_obtained(), [2, 0])
+
+    def test_grade_closed_quizzes_grades_each_ended_quiz_once(self):
+        self.assertEqual(grade_closed_quizzes(), {})
+        QuizOrViva.objects.filter(id=self.quiz.id).update(end_time=timezone.now())
+        self.answer(self.links[1], self.questions[1], "A")
+        out = StringIO()
+        call_command("gradequizzes", stdout=out)
+        self.assertIn(f"Graded 2 students of {self.quiz.id}", out.getvalue())
+        self.assertEqual(self.marks_obtained(), [0, 2])
+        self.assertEqual(grade_closed_quizzes(), {})
+
+
+class ImportTests(QuestionBankTestCase):
+    def import_rows(self, content, file_format, qbank=None):
+        return import_questions(
+            BytesIO(content.encode()),
+            file_format,
+            (qbank or self.qbank).id,
+            self.module.id,
+            1,
+            self.faculty.id,
+        )
+
+    def jsonl(self, *rows):
+        return "".join(
+            (row if isinstance(row, str) else json.dumps(row)) + "\n" for row in rows
+        )
+
+    def question(self, **fields):
+        return {
+            "question": "Question",
+            "options": [
+                {"option_number": "A", "option": "a", "is_correct": True},
+                {"option_number": "B", "option": "b", "is_correct": False},
+            ],
+            **fields,
+        }
+
+    def answer_keys(self, qbank=None):
+        return [
+            list(
+                question.options_set.order_by("option_number").values_list(
+                    "option_number", "is_correct"
+                )
+            )
+            for question in Question.objects.filter(
+                qbank=qbank or self.qbank
+            ).order_by("question_number")
+        ]
+
+    def test_jsonl_reports_bad_rows_and_imports_the_rest(self):
+        option = {"option_number": "A", "option": "a"}
+        report = self.import_rows(
+            self.jsonl(
+                self.question(),
+                "{not json",
+                "[1, 2]",
+                self.question(options={"A": "a"}),
+                self.question(question={"nested": True}),
+                self.question(options=[{**option, "is_correct": "no"}]),
+                self.question(marks=-1),
+                self.question(module_id="missing"),
+                self.question(),
+            ),
+            "jsonl",
+        )
+        self.assertEqual(report["created"], 2)
+        self.assertEqual(
+            [(error["row"], error["message"]) for error in report["errors"]],
+            [
+                (2, "Invalid JSON"),
+                (3, "Row is not an object"),
+                (4, "Options must be a list"),
+                (5, "Invalid field values"),
+                (6, "is_correct must be true or false"),
+                (7, "Marks must be a whole number of at least 0"),
+                (8, "Module not found"),
+            ],
+        )
+
+    def test_is_correct_strings_keep_their_meaning(self):
+        options = [
+            {"option_number": "A", "option": "a", "is_correct": "false"},
+            {"option_number": "B", "option": "b", "is_correct": "True"},
+            {"option_number": "C", "option": "c", "is_correct": 0},
+            {"option_number": "D", "option": "d"},
+        ]
+        report = self.import_rows(self.jsonl(self.question(options=options)), "jsonl")
+        self.assertEqual(report["failed"], 0)
+        self.assertEqual(
+            self.answer_keys(),
+            [[("A", False), ("B", True), ("C", False), ("D", False)]],
+        )
+
+    def test_csv_marks_the_listed_letters_correct(self):
+        report = self.import_rows(
+            "question,marks,correct,A,B,C\n"
+            "First,2,B,a,b,c\n"
+            "Second,x,A,a,b,\n"
+            "Third,,a;c,a,b,c\n",
+            "csv",
+        )
+        self.assertEqual(report["created"], 2)
+        self.assertEqual(
+            report["errors"], [{"row": 2, "message": "Invalid field values"}]
+        )
+        self.assertEqual(
+            self.answer_keys(),
+            [
+                [("A", False), ("B", True), ("C", False)],
+                [("A", True), ("B", False), ("C", True)],
+            ],
+        )
+        self.assertEqual(
+            list(Question.objects.order_by("question_number").values_list("marks")),
+            [(2,), (1,)],
+        )
+
+    def test_moodle_xml_imports_choice_questions(self):
+        report = self.import_rows(
+            """<?xml version="1.0"?>
+            <quiz>
+              <question type="category"><category><text>c</text></category></question>
+              <question type="multichoice">
+                <questiontext><text><![CDATA[<p>Pick one</p>]]></text></questiontext>
+                <defaultgrade>3</defaultgrade>
+                <answer fraction="0"><text>a</text></answer>
+                <answer fraction="100"><text>b</text></answer>
+              </question>
+              <question type="essay">
+                <questiontext><text>e</text></questiontext>
+              </question>
+            </quiz>""",
+            "xml",
+        )
+        self.assertEqual(report["created"], 1)
+        self.assertEqual(
+            report["errors"],
+            # Categories are not rows of their own
+            [{"row": 2, "message": "Unsupported Moodle question type essay"}],
+        )
+        question = Question.objects.get()
+        self.assertEqual((question.question, question.marks), ("Pick one", 3))
+        self.assertEqual(self.answer_keys(), [[("A", False), ("B", True)]])
+
+    def test_export_then_import_gives_the_same_questions(self):
+        self.add_question(1, 2, weight=3)
+        self.add_question(2, 0, weight=0)
+        fields = ("question_number", "question", "marks", "weight", "module_id")
+        for file_format in EXPORTERS:
+            exporter, _ = EXPORTERS[file_format]
+            qbank = QuestionBank.objects.create(title=file_format, creator=self.faculty)
+            content = "".join(exporter(self.qbank.id))
+            report = self.import_rows(content, file_format, qbank)
+            self.assertEqual((report["created"], report["failed"]), (2, 0))
+            self.assertEqual(
+                list(
+                    Question.objects.filter(qbank=qbank)
+                    .order_by("question_number")
+                    .values_list(*fields)
+                ),
+                list(
+                    Question.objects.filter(qbank=self.qbank)
+                    .order_by("question_number")
+                    .values_list(*fields)
+                ),
+            )
+            self.assertEqual(self.answer_keys(qbank), self.answer_keys())
+
+
+class SamplingTests(SimpleTestCase):
+    def setUp(self):
+        # Modules m1 with 10 even weights, m2 with 10 rising weights and m3
+        # with 6 questions of which the first 3 have a weight of 0
+        modules = ["m1"] * 10 + ["m2"] * 10 + ["m3"] * 6
+        weights = [1] * 10 + list(range(1, 11)) + [0, 0, 0, 1, 2, 3]
+        self.modules = dict(enumerate(modules))
+        self.pool = QuestionPool(modules, weights)
+        self.zero_weight = {20, 21, 22}
+
+    def per_module(self, picked):
+        counts = {}
+        for index in picked:
+            counts[self.modules[index]] = counts.get(self.modules[index], 0) + 1
+        return counts
+
+    def test_each_module_gives_its_quota(self):
+        # m1 takes the Fisher-Yates path, m2 the alias table and m3 A-Res
+        for quota in ({"m1": 3, "m2": 4, "m3": 2}, {"m2": 8}, {"m3": 5}):
+            for seed in range(50):
+                picked = self.pool.sample(quota, seed)
+                self.assertEqual(picked, sorted(set(picked)))
+                self.assertEqual(
+                    self.per_module(picked),
+                    {
+                        module: min(count, self.pool.count({module: count}))
+                        for module, count in quota.items()
+                    },
+                )
+
+    def test_same_seed_gives_the_same_questions(self):
+        quota = {"m1": 3, "m2": 4, "m3": 2}
+        draws = {tuple(self.pool.sample(quota, seed)) for seed in range(20)}
+        self.assertGreater(len(draws), 1)
+        for seed in range(20):
+            self.assertEqual(
+                self.pool.sample(quota, seed), self.pool.sample(quota, seed)
+            )
+        # Nor does the order of the quota keys matter
+        self.assertEqual(
+            self.pool.sample({"m3": 2, "m2": 4, "m1": 3}, 7),
+            self.pool.sample(quota, 7),
+        )
+        self.assertEqual(
+            exam_seed("quiz", "link", "sample"), exam_seed("quiz", "link", "sample")
+        )
+
+    def test_zero_weight_questions_are_never_drawn(self):
+        self.assertEqual(self.pool.count({"m3": 5, "m1": 20, "m4": 1}), 13)
+        for quota in ({"m3": 1}, {"m3": 2}, {"m3": 3}):
+            for seed in range(200):
+                picked = set(self.pool.sample(quota, seed))
+                self.assertFalse(picked & self.zero_weight)
+
+    def test_alias_table_draws_in_proportion_to_weight(self):
+        table = AliasTable([1, 3, 0, 4])
+        rng = random.Random(0)
+        draws = [table.draw(rng) for _ in range(40000)]
+        self.assertNotIn(2, draws)
+        for index, share in ((0, 1 / 8), (1, 3 / 8), (3, 4 / 8)):
+            self.assertAlmostEqual(draws.count(index) / len(draws), share, delta=0.01)
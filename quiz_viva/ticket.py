@@ -0,0 +1,113 @@
+import jwt
+import time
+from datetime import timedelta
+
+from quiz_viva.models import StudentQuizOrVivaLink
+from quizverse_backend.settings import SECRET_KEY, JWT_ALGORITHM
+from quizverse_backend.urls import api
+
+EXAM_TICKET_HEADER = "X-Exam-Ticket"
+
+
+class InvalidExamTicket(Exception):
+    pass
+
+
+class ExamNotInProgress(Exception):
+    pass
+
+
+@api.exception_handler(InvalidExamTicket)
+def on_invalid_exam_ticket(request, exc):
+    return api.create_response(
+        request, {"detail": "Invalid exam ticket supplied"}, status=401
+    )
+
+
+@api.exception_handler(ExamNotInProgress)
+def on_exam_not_in_progress(request, exc):
+    return api.create_response(request, {"message": str(exc)}, status=400)
+
+
+def get_exam_deadline(student_quiz_or_viva_link):
+    quiz_or_viva = student_quiz_or_viva_link.quiz_or_viva
+    return min(
+        student_quiz_or_viva_link.start_time
+        + timedelta(minutes=quiz_or_viva.duration),
+        quiz_or_viva.end_time,
+    )
+
+
+def get_exam_claims(student_quiz_or_viva_link, user_id):
+    # Everything the in-exam endpoints need to know about a started link
+    quiz_or_viva = student_quiz_or_viva_link.quiz_or_viva
+    return {
+        "user": user_id,
+        "quiz": str(quiz_or_viva.id),
+        "link": str(student_quiz_or_viva_link.id),
+        "qbank": str(quiz_or_viva.qbank_id),
+        "version": quiz_or_viva.qbank_version,
+        "shuffle": quiz_or_viva.shuffle,
+        "quota": quiz_or_viva.module_quota,
+        "exp": int(get_exam_deadline(student_quiz_or_viva_link).timestamp()),
+        "tokenType": "exam",
+    }
+
+
+def generate_exam_ticket(student_quiz_or_viva_link, user_id):
+    claims = get_exam_claims(student_quiz_or_viva_link, user_id)
+    return jwt.encode(claims, SECRET_KEY, algorithm=JWT_ALGORITHM)
+
+
+def decode_exam_ticket(ticket, quiz_or_viva_id):
+    try:
+        claims = jwt.decode(
+            ticket,
+            SECRET_KEY,
+            algorithms=JWT_ALGORITHM,
+            options={"verify_exp": False},
+        )
+    except jwt.InvalidTokenError:
+        raise InvalidExamTicket
+    if (
+        claims.get("tokenType") != "exam"
+        or claims.get("quiz") != str(quiz_or_viva_id)
+    ):
+        raise InvalidExamTicket
+    return claims
+
+
+def verify_exam_ticket(request, quiz_or_viva_id):
+    """
+    Claims of the exam ticket sent in the X-Exam-Ticket header, checked
+    without touching the database. Returns None if the request has none.
+    The deadline is left to the caller so it can answer with a message.
+    """
+    if not (ticket := request.headers.get(EXAM_TICKET_HEADER)):
+        return None
+    claims = decode_exam_ticket(ticket, quiz_or_viva_id)
+    if claims.get("user") != request.auth["user"]:
+        raise InvalidExamTicket
+    return refresh_expired_claims(claims)
+
+
+def refresh_expired_claims(claims):
+    """
+    A ticket keeps the deadline it was issued with, so once it is past its
+    exp the claims are rebuilt from the link row in case the quiz was
+    extended since. Only requests after the original deadline read it.
+    """
+    if seconds_left(claims) >= 0:
+        return claims
+    student_quiz_or_viva_link = (
+        StudentQuizOrVivaLink.objects.select_related("quiz_or_viva__qbank")
+        .filter(id=claims["link"], start_time__isnull=False)
+        .first()
+    )
+    if student_quiz_or_viva_link is None:
+        return claims
+    return get_exam_claims(student_quiz_or_viva_link, claims["user"])
+
+
+def seconds_left(claims):
+    return claims["exp"] - time.time()
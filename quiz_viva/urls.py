@@ -0,0 +1,7 @@
+from django.urls import path
+
+from quiz_viva.events import exam_events
+
+urlpatterns = [
+    path("events/", exam_events),
+]
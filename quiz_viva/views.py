@@ -1,18 +1,52 @@
-from ninja import Router
+import os
+
+from ninja import Router, File
+from ninja.files import UploadedFile
 from typing import Any
 from datetime import timedelta
 
+from django.db.models import F, Max
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 
 from quiz_viva.schemas import *
 from quiz_viva.models import *
-from admin.models import Course, Module, Student
+from quiz_viva.paper import get_paper
+from quiz_viva.grading import grade_link, grade_quiz, publish_quiz
+from quiz_viva.assignment import assign_students, get_cohort
+from quiz_viva.tasks import assign_students_task
+from quiz_viva.authoring import insert_questions, validate_questions
+from quiz_viva.importers import IMPORT_FORMATS, READERS, import_questions
+from quiz_viva.exporters import EXPORTERS
+from quiz_viva.events import broadcaster
+from quiz_viva.sampling import sample_questions
+from quiz_viva.shuffle import option_order, shuffle_questions
+from quiz_viva.ticket import (
+    ExamNotInProgress,
+    generate_exam_ticket,
+    get_exam_claims,
+    get_exam_deadline,
+    seconds_left,
+    verify_exam_ticket,
+)
+from admin.models import Course, Student
 from utils.authentication import AuthBearer, role_required
+from utils.admission import exam_admission
+from jobs.tasks import enqueue
 
 router = Router(auth=AuthBearer())
 
 
+def get_student_link(request, quiz_or_viva_id):
+    # Caller's student row, the quiz and its qbank in a single joined query
+    return get_object_or_404(
+        StudentQuizOrVivaLink.objects.select_related("quiz_or_viva__qbank"),
+        quiz_or_viva_id=quiz_or_viva_id,
+        student__user_id=request.auth["user"],
+    )
+
+
 @router.post("/qbank/", response={200: QBankOutSchema, 400: Any})
 @role_required(["Faculty"])
 def create_qbank(request, data: QBankInSchema):
@@ -23,6 +57,49 @@ def create_qbank(request, data: QBankInSchema):
     return 200, qbank
 
 
+@router.post("/qbank/{qbank_id}/import/", response={200: Any, 400: Any})
+@role_required(["Faculty"])
+def import_qbank(
+    request,
+    qbank_id: str,
+    file: UploadedFile = File(...),
+    format: str = None,
+    module_id: str = None,
+):
+    qbank = get_object_or_404(
+        QuestionBank, id=qbank_id, creator_id=request.auth["user"]
+    )
+    extension = os.path.splitext(file.name or "")[1].lower()
+    if (file_format := format or IMPORT_FORMATS.get(extension)) not in READERS:
+        return 400, {"message": "Format must be csv, jsonl or xml"}
+    last_number = Question.objects.filter(qbank=qbank).aggregate(
+        last=Max("question_number")
+    )["last"]
+    report = import_questions(
+        file,
+        file_format,
+        qbank.id,
+        module_id,
+        (last_number or 0) + 1,
+        request.auth["user"],
+    )
+    return 200, report
+
+
+@router.get("/qbank/{qbank_id}/export", response={200: Any, 400: Any})
+@role_required(["Faculty"])
+def export_qbank(request, qbank_id: str, format: str = "jsonl"):
+    qbank = get_object_or_404(
+        QuestionBank, id=qbank_id, creator_id=request.auth["user"]
+    )
+    if format not in EXPORTERS:
+        return 400, {"message": "Format must be csv or jsonl"}
+    exporter, content_type = EXPORTERS[format]
+    response = StreamingHttpResponse(exporter(qbank.id), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{qbank.id}.{format}"'
+    return response
+
+
 @router.get("/qbank", response={200: List[QBankOutSchema], 400: Any})
 @role_required(["Faculty"])
 def get_qbank(request):
@@ -33,21 +110,11 @@ def get_qbank(request):
 @router.post("/question/", response={200: Any, 400: Any})
 @role_required(["Faculty"])
 def create_question(request, data: List[QuestionInSchema]):
-    for question in data:
-        qbank = get_object_or_404(
-            QuestionBank, id=question.qbank_id, creator_id=request.auth["user"]
-        )
-        module = get_object_or_404(Module, id=question.module_id)
-        question_data = Question.objects.create(
-            question_number=question.question_number,
-            question=question.question,
-            question_type=question.question_type,
-            qbank=qbank,
-            module=module,
-        )
-        for option in question.options:
-            Options.objects.create(question=question_data, **option.dict())
-    return 200, {"message": "Questions created successfully"}
+    questions = [question.dict() for question in data]
+    if errors := validate_questions(questions, request.auth["user"]):
+        return 400, {"message": "Invalid questions", "errors": errors}
+    count = insert_questions(questions)
+    return 200, {"message": "Questions created successfully", "count": count}
 
 
 @router.get("/question", response={200: List[QuestionOutSchema], 400: Any})
@@ -59,6 +126,23 @@ def get_question(request, qbank_id: str):
     return 200, question
 
 
+def get_assigned_students(request, student_ids, cohort):
+    """
+    Ids of the explicitly listed students plus the cohort's, found with one
+    query each, and an error message if the request does not add up.
+    """
+    student_ids = set(student_ids)
+    found = set(Student.objects.filter(id__in=student_ids).values_list("id", flat=True))
+    if missing := sorted(student_ids - found):
+        return None, {"message": "Students not found", "student_ids": missing}
+    if cohort is not None:
+        if all(value is None for value in cohort.values()):
+            return None, {"message": "Cohort needs a course, department or semester"}
+        institution_link = request.principal.require("institution_link")
+        found.update(get_cohort(institution_link.institution_id, **cohort))
+    return found, None
+
+
 @router.post("/viva/", response={200: QuizOrVivaOutSchema, 400: Any})
 @role_required(["Faculty"])
 def create_quiz_or_viva(request, data: QuizOrVivaInSchema):
@@ -66,14 +150,69 @@ def create_quiz_or_viva(request, data: QuizOrVivaInSchema):
     data["conductor_id"] = request.auth["user"]
     data["qbank"] = get_object_or_404(QuestionBank, id=data.pop("qbank_id"))
     data["is_private"] = True
-    student_ids = data.pop("student_id")
+    if any(count <= 0 for count in data["module_quota"].values()):
+        return 400, {"message": "Questions per module must be positive"}
+    # The last student to be let in must still get the full duration, as
+    # every deadline is capped at end_time, see get_exam_deadline
+    latest_start = data["start_time"] + timedelta(seconds=data["start_window"])
+    if latest_start + timedelta(minutes=data["duration"]) > data["end_time"]:
+        return 400, {"message": "Start window leaves the last students short of time"}
+    student_ids, error = get_assigned_students(
+        request, data.pop("student_id"), data.pop("cohort")
+    )
+    if error:
+        return 400, error
     quiz_or_viva = QuizOrViva.objects.create(**data)
-    for student_id in student_ids:
-        student = get_object_or_404(Student, id=student_id)
-        StudentQuizOrVivaLink.objects.create(student=student, quiz_or_viva=quiz_or_viva)
+    assign_students(quiz_or_viva, student_ids)
+    publish_quiz(quiz_or_viva)
     return 200, quiz_or_viva
 
 
+@router.post("/viva/{quiz_or_viva_id}/assign/", response={202: Any, 400: Any})
+@role_required(["Faculty"])
+def assign_viva(request, quiz_or_viva_id: str, data: AssignStudentsSchema):
+    quiz_or_viva = get_object_or_404(
+        QuizOrViva, id=quiz_or_viva_id, conductor_id=request.auth["user"]
+    )
+    data = data.dict()
+    student_ids, error = get_assigned_students(
+        request, data["student_id"], data["cohort"]
+    )
+    if error:
+        return 400, error
+    job = enqueue(
+        assign_students_task,
+        created_by_id=request.auth["user"],
+        quiz_or_viva_id=str(quiz_or_viva.id),
+        student_ids=sorted(student_ids),
+    )
+    return 202, {
+        "message": "Students are being assigned",
+        "count": len(student_ids),
+        "job_id": job.id,
+    }
+
+
+@router.post(
+    "/viva/{quiz_or_viva_id}/publish/",
+    response={200: QuizOrVivaOutSchema, 400: Any},
+)
+@role_required(["Faculty"])
+def publish_viva(request, quiz_or_viva_id: str):
+    quiz_or_viva = get_object_or_404(
+        QuizOrViva, id=quiz_or_viva_id, conductor_id=request.auth["user"]
+    )
+    # Refreezing would swap the questions and totals under started students
+    if (
+        quiz_or_viva.start_time <= timezone.now()
+        or StudentQuizOrVivaLink.objects.filter(
+            quiz_or_viva_id=quiz_or_viva.id, start_time__isnull=False
+        ).exists()
+    ):
+        return 400, {"message": "Viva has already started"}
+    return 200, publish_quiz(quiz_or_viva)
+
+
 @router.get("/viva", response={200: List[QuizOrVivaOutSchema], 400: Any})
 @role_required(["Faculty", "Student"])
 def get_viva(request):
@@ -81,7 +220,7 @@ def get_viva(request):
     if "Faculty" in request.auth["roles"]:
         quiz_or_viva = quiz_or_viva.filter(conductor_id=request.auth["user"]).all()
     elif "Student" in request.auth["roles"]:
-        student = get_object_or_404(Student, user_id=request.auth["user"])
+        student = request.principal.require("student")
         student_link = (
             StudentQuizOrVivaLink.objects.filter(student=student)
             .all()
@@ -91,149 +230,319 @@ def get_viva(request):
     return 200, quiz_or_viva
 
 
+@router.post("/viva/{quiz_or_viva_id}/grade/", response={200: Any, 400: Any})
+@role_required(["Faculty"])
+def grade_viva(request, quiz_or_viva_id: str):
+    get_object_or_404(QuizOrViva, id=quiz_or_viva_id, conductor_id=request.auth["user"])
+    graded = grade_quiz(quiz_or_viva_id)
+    return 200, {"message": "Viva graded successfully", "count": graded}
+
+
+@router.post("/viva/{quiz_or_viva_id}/extend/", response={200: Any, 400: Any})
+@role_required(["Faculty"])
+def extend_viva(request, quiz_or_viva_id: str, data: ExtendVivaSchema):
+    if data.minutes <= 0:
+        return 400, {"message": "Minutes must be positive"}
+    # Every deadline moves by the same amount, see get_exam_deadline
+    extended = QuizOrViva.objects.filter(
+        id=quiz_or_viva_id,
+        conductor_id=request.auth["user"],
+        end_time__gt=timezone.now(),
+    ).update(
+        duration=F("duration") + data.minutes,
+        end_time=F("end_time") + timedelta(minutes=data.minutes),
+    )
+    if not extended:
+        return 400, {"message": "Viva not found or already over"}
+    # Tickets keep their old exp, so clients fetch a new one from /exam-ticket
+    broadcaster.publish(
+        quiz_or_viva_id, "extend", {"minutes": data.minutes, "refresh_ticket": True}
+    )
+    return 200, {"message": "Viva extended successfully"}
+
+
+@router.post("/viva/{quiz_or_viva_id}/end/", response={200: Any, 400: Any})
+@role_required(["Faculty"])
+def end_viva(request, quiz_or_viva_id: str):
+    now = timezone.now()
+    ended = QuizOrViva.objects.filter(
+        id=quiz_or_viva_id, conductor_id=request.auth["user"], end_time__gt=now
+    ).update(end_time=now)
+    if not ended:
+        return 400, {"message": "Viva not found or already over"}
+    # Submitting the running exams also stops responses sent with a ticket
+    StudentQuizOrVivaLink.objects.filter(quiz_or_viva_id=quiz_or_viva_id).submit(now)
+    broadcaster.publish(quiz_or_viva_id, "end", {"reason": "ended"})
+    return 200, {"message": "Viva ended successfully"}
+
+
 @router.get("/start-viva", response={200: Any, 400: Any})
 @role_required(["Student"])
+@exam_admission
 def start_viva(request, quiz_or_viva_id: str):
-    student = get_object_or_404(Student, user_id=request.auth["user"])
-    quiz_or_viva = get_object_or_404(QuizOrViva, id=quiz_or_viva_id)
-    student_quiz_or_viva_link = get_object_or_404(
-        StudentQuizOrVivaLink,
-        quiz_or_viva_id=quiz_or_viva_id,
-        student=student,
-    )
+    started = StudentQuizOrVivaLink.objects.filter(
+        quiz_or_viva_id=quiz_or_viva_id, student__user_id=request.auth["user"]
+    ).start()
+    if started:
+        student_quiz_or_viva_link = get_student_link(request, quiz_or_viva_id)
+        return 200, {
+            "message": "Viva started successfully",
+            "ticket": generate_exam_ticket(
+                student_quiz_or_viva_link, request.auth["user"]
+            ),
+            "deadline": get_exam_deadline(student_quiz_or_viva_link),
+        }
+
+    # Only a rejected start pays for a read to explain why
+    student_quiz_or_viva_link = get_student_link(request, quiz_or_viva_id)
+    quiz_or_viva = student_quiz_or_viva_link.quiz_or_viva
     if not (quiz_or_viva.start_time <= timezone.now() < quiz_or_viva.end_time):
         return 400, {"message": "Viva is over or not started yet"}
-    if student_quiz_or_viva_link.start_time is not None:
-        return 400, {"message": "Viva already started"}
-    student_quiz_or_viva_link.start_time = timezone.now()
-    student_quiz_or_viva_link.save()
-    return 200, {"message": "Viva started successfully"}
+    if student_quiz_or_viva_link.malpractice:
+        return 400, {"message": "Malpractice detected you can't start the viva"}
+    if (
+        student_quiz_or_viva_link.start_time is None
+        and student_quiz_or_viva_link.start_after is not None
+    ):
+        return 400, {
+            "message": "Your start window has not opened yet",
+            "start_after": student_quiz_or_viva_link.start_after,
+        }
+    return 400, {"message": "Viva already started"}
 
 
-@router.get("/remaining-time", response={200: Any, 400: Any})
+@router.post("/submit/", response={200: Any, 400: Any})
 @role_required(["Student"])
-def get_remaining_time(request, quiz_or_viva_id: str):
-    student = get_object_or_404(Student, user_id=request.auth["user"])
-    quiz_or_viva = get_object_or_404(QuizOrViva, id=quiz_or_viva_id)
-    student_quiz_or_viva_link = get_object_or_404(
-        StudentQuizOrVivaLink,
-        quiz_or_viva_id=quiz_or_viva_id,
-        student=student,
-    )
+def submit_viva(request, quiz_or_viva_id: str):
+    submitted = StudentQuizOrVivaLink.objects.filter(
+        quiz_or_viva_id=quiz_or_viva_id, student__user_id=request.auth["user"]
+    ).submit()
+    if not submitted:
+        student_quiz_or_viva_link = get_student_link(request, quiz_or_viva_id)
+        if student_quiz_or_viva_link.start_time is None:
+            return 400, {"message": "Viva not started"}
+        return 400, {"message": "Viva already submitted"}
+    return 200, {"message": "Viva submitted successfully"}
+
+
+def lock_malpractice(quiz_or_viva_id, student_quiz_or_viva_link_id):
+    if StudentQuizOrVivaLink.objects.filter(
+        id=student_quiz_or_viva_link_id
+    ).flag_malpractice():
+        broadcaster.publish(
+            quiz_or_viva_id, "malpractice", {"link": str(student_quiz_or_viva_link_id)}
+        )
+
+
+def get_exam(request, quiz_or_viva_id, check_deadline=True):
+    """
+    Claims describing the caller's running exam. They come from the exam
+    ticket when the request carries one and from the link row otherwise.
+    """
+    if (exam := verify_exam_ticket(request, quiz_or_viva_id)) is None:
+        student_quiz_or_viva_link = get_student_link(request, quiz_or_viva_id)
+        if student_quiz_or_viva_link.start_time is None:
+            raise ExamNotInProgress("Viva not started")
+        exam = get_exam_claims(student_quiz_or_viva_link, request.auth["user"])
+    if check_deadline and seconds_left(exam) < 0:
+        raise ExamNotInProgress("Viva is over")
+    return exam
+
+
+@router.get("/exam-ticket", response={200: Any, 400: Any})
+@role_required(["Student"])
+@exam_admission
+def get_exam_ticket(request, quiz_or_viva_id: str):
+    student_quiz_or_viva_link = get_student_link(request, quiz_or_viva_id)
     if student_quiz_or_viva_link.start_time is None:
         return 400, {"message": "Viva not started"}
-    remaining_time = (
-        student_quiz_or_viva_link.start_time
-        + timedelta(minutes=quiz_or_viva.duration)
-        - timezone.now()
-    )
-    return 200, {"message": remaining_time.total_seconds()}
+    if student_quiz_or_viva_link.malpractice:
+        return 400, {"message": "Malpractice detected you can't continue the viva"}
+    if student_quiz_or_viva_link.submitted_at is not None:
+        return 400, {"message": "Viva already submitted"}
+    if get_exam_deadline(student_quiz_or_viva_link) < timezone.now():
+        return 400, {"message": "Viva is over"}
+    return 200, {
+        "ticket": generate_exam_ticket(
+            student_quiz_or_viva_link, request.auth["user"]
+        ),
+        "deadline": get_exam_deadline(student_quiz_or_viva_link),
+    }
 
 
-@router.get("/viva-question", response={200: List[QuestionOutSchema], 400: Any})
+@router.get("/remaining-time", response={200: Any, 400: Any})
+@role_required(["Student"])
+def get_remaining_time(request, quiz_or_viva_id: str):
+    exam = get_exam(request, quiz_or_viva_id, check_deadline=False)
+    return 200, {"message": seconds_left(exam)}
+
+
+def get_exam_paper(exam):
+    """
+    The shared paper of the exam and the indexes of the caller's questions
+    in the order they see them, or None when that is the whole paper as is.
+    """
+    paper = get_paper(exam["qbank"], exam["version"], exam["quiz"])
+    questions = None
+    if exam.get("quota"):
+        questions = sample_questions(paper, exam["quota"], exam["quiz"], exam["link"])
+    if exam.get("shuffle"):
+        if questions is None:
+            questions = range(len(paper.question_ids))
+        questions = shuffle_questions(questions, exam["quiz"], exam["link"])
+    return paper, questions
+
+
+def get_option_order(exam, paper, question_id):
+    if not exam.get("shuffle"):
+        return None
+    return option_order(paper, exam["quiz"], exam["link"], question_id)
+
+
+@router.get(
+    "/viva-question", response={200: List[PaperQuestionOutSchema], 400: Any}
+)
 @role_required(["Student"])
+@exam_admission
 def get_viva_question(request, quiz_or_viva_id: str):
-    student = get_object_or_404(Student, user_id=request.auth["user"])
-    quiz_or_viva = get_object_or_404(QuizOrViva, id=quiz_or_viva_id)
-    student_quiz_or_viva_link = get_object_or_404(
-        StudentQuizOrVivaLink,
-        quiz_or_viva_id=quiz_or_viva_id,
-        student=student,
+    exam = get_exam(request, quiz_or_viva_id)
+    paper, questions = get_exam_paper(exam)
+    if questions is None:
+        return HttpResponse(paper.questions, content_type="application/json")
+    return HttpResponse(
+        paper.render_questions(questions), content_type="application/json"
     )
-    if student_quiz_or_viva_link.start_time is None:
-        return 400, {"message": "Viva not started"}
-    if student_quiz_or_viva_link.start_time + timedelta(quiz_or_viva.duration) < timezone.now():
-        return 400, {"message": "Viva is over"}
-    
-    questions = Question.objects.filter(qbank_id=quiz_or_viva.qbank_id).all()
-    return 200, questions
+
+
+@router.get(
+    "/viva-paper", response={200: List[PaperQuestionOutSchema], 400: Any}
+)
+@role_required(["Student"])
+@exam_admission
+def get_viva_paper(request, quiz_or_viva_id: str):
+    exam = get_exam(request, quiz_or_viva_id)
+    paper, questions = get_exam_paper(exam)
+    if questions is None:
+        return HttpResponse(paper.content, content_type="application/json")
+    content = paper.render(
+        questions, lambda question_id: get_option_order(exam, paper, question_id)
+    )
+    return HttpResponse(content, content_type="application/json")
 
 
 @router.get("/viva-options", response={200: List[OptionOutSchema], 400: Any})
 @role_required(["Student"])
 def get_options(request, question_id: str, quiz_or_viva_id: str):
-    student = get_object_or_404(Student, user_id=request.auth["user"])
-    quiz_or_viva = get_object_or_404(QuizOrViva, id=quiz_or_viva_id)
-    student_quiz_or_viva_link = get_object_or_404(
-        StudentQuizOrVivaLink,
-        quiz_or_viva_id=quiz_or_viva_id,
-        student=student,
+    exam = get_exam(request, quiz_or_viva_id)
+    paper, questions = get_exam_paper(exam)
+    if questions is not None and question_id not in {
+        paper.question_ids[i] for i in questions
+    }:
+        return HttpResponse(b"[]", content_type="application/json")
+    options = paper.render_options(
+        question_id, get_option_order(exam, paper, question_id)
     )
-    if student_quiz_or_viva_link.start_time is None:
-        return 400, {"message": "Viva not started"}
-    if student_quiz_or_viva_link.start_time + timedelta(quiz_or_viva.duration) < timezone.now():
-        return 400, {"message": "Viva is over"}
-
-    options = Options.objects.filter(question_id=question_id).all()
-    return 200, options
+    return HttpResponse(options, content_type="application/json")
 
 
 @router.post("/response/", response={200: Any, 400: Any})
 @role_required(["Student"])
 def create_response(request, data: StudentResponseInSchema):
-    user_link = get_object_or_404(Student, user_id=request.auth["user"])
-    quiz_or_viva = get_object_or_404(QuizOrViva, id=data.quiz_or_viva_id)
-    if not (quiz_or_viva.start_time <= timezone.now() < quiz_or_viva.end_time):
-        return 400, {"message": "Viva is over"}
-
-    student_quiz_or_viva_link = get_object_or_404(
-        StudentQuizOrVivaLink,
-        quiz_or_viva_id=data.quiz_or_viva_id,
-        student=user_link,
+    status, response = create_responses(
+        request,
+        BatchResponseInSchema(
+            quiz_or_viva_id=data.quiz_or_viva_id,
+            malpractice=data.malpractice,
+            responses=[
+                ResponseItemSchema(
+                    question_id=data.question_id, option_id=data.option_id
+                )
+            ],
+        ),
     )
-    if student_quiz_or_viva_link.malpractice or data.malpractice:
-        student_quiz_or_viva_link.malpractice = True
-        student_quiz_or_viva_link.save()
-        return 400, {"message": "Malpractice detected you can't submit the response"}
+    if status == 200:
+        response = {"message": "Response submitted successfully"}
+    return status, response
 
-    if student_quiz_or_viva_link.start_time is None:
-        return 400, {"message": "Viva not started"}
-    else:
-        end_time = student_quiz_or_viva_link.start_time + timedelta(
-            minutes=quiz_or_viva.duration
-        )
-        if timezone.now() > end_time:
-            return 400, {"message": "Time over"}
-
-    question = get_object_or_404(Question, id=data.question_id)
-    option = get_object_or_404(Options, id=data.option_id)
-    try:
-        StudentResponse.objects.update_or_create(
-            student_quiz_or_viva_link=student_quiz_or_viva_link,
-            question=question,
-            option=option,
-        )
-    except:
-        StudentResponse.objects.filter(
-            student_quiz_or_viva_link=student_quiz_or_viva_link, question=question
-        ).update(option=option)
-    if option.is_correct:
-        student_quiz_or_viva_link.marks_obtained += question.marks
-    student_quiz_or_viva_link.save()
 
-    return 200, {"message": "Response submitted successfully"}
+@router.post("/responses/", response={200: Any, 400: Any})
+@role_required(["Student"])
+def create_responses(request, data: BatchResponseInSchema):
+    if (exam := verify_exam_ticket(request, data.quiz_or_viva_id)) is None:
+        student_quiz_or_viva_link = get_student_link(request, data.quiz_or_viva_id)
+        quiz_or_viva = student_quiz_or_viva_link.quiz_or_viva
+        if not (quiz_or_viva.start_time <= timezone.now() < quiz_or_viva.end_time):
+            return 400, {"message": "Viva is over"}
+        if student_quiz_or_viva_link.malpractice or data.malpractice:
+            lock_malpractice(quiz_or_viva.id, student_quiz_or_viva_link.id)
+            return 400, {
+                "message": "Malpractice detected you can't submit the response"
+            }
+        if student_quiz_or_viva_link.submitted_at is not None:
+            return 400, {"message": "Viva already submitted"}
+        if student_quiz_or_viva_link.start_time is None:
+            return 400, {"message": "Viva not started"}
+        exam = get_exam_claims(student_quiz_or_viva_link, request.auth["user"])
+    elif data.malpractice:
+        lock_malpractice(exam["quiz"], exam["link"])
+        return 400, {"message": "Malpractice detected you can't submit the response"}
+    # A ticket cannot know about later flags or submits, so the write is
+    # guarded by a conditional update instead of a read
+    elif not StudentQuizOrVivaLink.objects.filter(
+        id=exam["link"], malpractice=False, submitted_at__isnull=True
+    ).update(updated_at=timezone.now()):
+        return 400, {"message": "Viva already submitted or malpractice detected"}
+    if seconds_left(exam) < 0:
+        return 400, {"message": "Time over"}
+
+    # Every option must belong to its question and the question to this quiz
+    paper, questions = get_exam_paper(exam)
+    option_ids = paper.option_ids
+    if questions is not None:
+        option_ids = {
+            paper.question_ids[i]: option_ids[paper.question_ids[i]]
+            for i in questions
+        }
+    errors = [
+        {"index": index, "message": "Option does not belong to the question"}
+        for index, item in enumerate(data.responses)
+        if item.option_id not in option_ids.get(item.question_id, ())
+    ]
+    if errors:
+        return 400, {"message": "Invalid responses", "errors": errors}
+
+    # The last answer to a question in the batch wins
+    answers = {item.question_id: item.option_id for item in data.responses}
+    StudentResponse.objects.bulk_create(
+        [
+            StudentResponse(
+                student_quiz_or_viva_link_id=exam["link"],
+                question_id=question_id,
+                option_id=option_id,
+            )
+            for question_id, option_id in answers.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["student_quiz_or_viva_link", "question"],
+        update_fields=["option", "updated_at"],
+    )
+    grade_link(exam["link"])
+    return 200, {"message": "Responses submitted successfully", "count": len(answers)}
 
 
 @router.get("/viva-result", response={200: VivaResult, 400: Any})
 @role_required(["Student"])
 def get_viva_result(request, quiz_or_viva_id: str):
-    student = get_object_or_404(Student, user_id=request.auth["user"])
-    quiz_or_viva = get_object_or_404(QuizOrViva, id=quiz_or_viva_id)
-    student_quiz_or_viva_link = get_object_or_404(
-        StudentQuizOrVivaLink,
-        quiz_or_viva_id=quiz_or_viva_id,
-        student=student,
-    )
+    student_quiz_or_viva_link = get_student_link(request, quiz_or_viva_id)
+    if student_quiz_or_viva_link.start_time is None:
+        return 400, {"message": "Viva not started"}
     if (
-        student_quiz_or_viva_link.start_time + timedelta(minutes=quiz_or_viva.duration)
-        > timezone.now()
+        student_quiz_or_viva_link.submitted_at is None
+        and get_exam_deadline(student_quiz_or_viva_link) > timezone.now()
     ):
         return 400, {"message": "Viva is not over yet"}
-    total_mark = Question.objects.filter(qbank_id=quiz_or_viva.qbank_id).aggregate(
-        total_marks=models.Count("id")
-    )["total_marks"]
     return 200, {
-        "total_marks": total_mark,
+        "total_marks": student_quiz_or_viva_link.total_marks,
         "marks_obtained": student_quiz_or_viva_link.marks_obtained,
-        "student_id": student.id,
+        "student_id": student_quiz_or_viva_link.student_id,
     }
@@ -2,6 +2,7 @@
 ASGI config for quizverse_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The exam event streams in quiz_viva.events are only served through it.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
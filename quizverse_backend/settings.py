@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     "users",
     "quiz_viva",
     "admin",
+    "jobs",
 ]
 
 MIDDLEWARE = [
@@ -147,9 +148,50 @@ PASSWORD_REGEX = os.environ.get("PASSWORD_REGEX")
 
 JWT_ALGORITHM = os.environ.get("JWT_ALGORITHM")
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
-EMAIL_HOST = 'smtp.gmail.com'
-EMAIL_USE_TLS = True
-EMAIL_PORT = 587
+# In-process cache of verified access tokens, a size of 0 disables it
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", 10000))
+TOKEN_CACHE_TTL = int(os.environ.get("TOKEN_CACHE_TTL", 300))
+
+# Cross-request cache of caller role memberships, a size of 0 disables it
+PRINCIPAL_CACHE_SIZE = int(os.environ.get("PRINCIPAL_CACHE_SIZE", 0))
+PRINCIPAL_CACHE_TTL = int(os.environ.get("PRINCIPAL_CACHE_TTL", 60))
+
+# In-process cache of serialized exam papers, see quiz_viva.paper
+PAPER_CACHE_SIZE = int(os.environ.get("PAPER_CACHE_SIZE", 256))
+PAPER_CACHE_TTL = int(os.environ.get("PAPER_CACHE_TTL", 3600))
+
+# Verify access tokens against the user's token_version instead of the token table
+STATELESS_ACCESS_TOKENS = os.environ.get("STATELESS_ACCESS_TOKENS", "False") == "True"
+
+# Seconds between clock events on idle exam event streams, see quiz_viva.events
+EXAM_EVENTS_HEARTBEAT = int(os.environ.get("EXAM_EVENTS_HEARTBEAT", 15))
+
+# In-flight exam requests admitted per worker, 0 disables admission control
+EXAM_ADMISSION_LIMIT = int(os.environ.get("EXAM_ADMISSION_LIMIT", 64))
+EXAM_ADMISSION_RETRY_AFTER = int(os.environ.get("EXAM_ADMISSION_RETRY_AFTER", 2))
+
+# Background jobs run by manage.py runjobs, see jobs.runner
+JOB_POLL_INTERVAL = int(os.environ.get("JOB_POLL_INTERVAL", 1))
+JOB_RETRY_BACKOFF = int(os.environ.get("JOB_RETRY_BACKOFF", 10))
+JOB_RETRY_BACKOFF_MAX = int(os.environ.get("JOB_RETRY_BACKOFF_MAX", 3600))
+# Running jobs not finished by then are taken over by another worker
+JOB_LOCK_TIMEOUT = int(os.environ.get("JOB_LOCK_TIMEOUT", 600))
+
+# Point these at django.core.mail.backends.locmem.EmailBackend or a local
+# debugging SMTP server to try emails without sending them
+EMAIL_BACKEND = (
+    os.environ.get("EMAIL_BACKEND") or 'django.core.mail.backends.smtp.EmailBackend'
+)
+EMAIL_HOST = os.environ.get("EMAIL_HOST") or 'smtp.gmail.com'
+EMAIL_USE_TLS = (os.environ.get("EMAIL_USE_TLS") or "True") == "True"
+EMAIL_PORT = int(os.environ.get("EMAIL_PORT") or 587)
 EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
+
+# Outbox emails sent per claimed batch and per second, see users.outbox
+EMAIL_BATCH_SIZE = int(os.environ.get("EMAIL_BATCH_SIZE", 100))
+EMAIL_RATE_LIMIT = int(os.environ.get("EMAIL_RATE_LIMIT", 5))
+EMAIL_MAX_ATTEMPTS = int(os.environ.get("EMAIL_MAX_ATTEMPTS", 5))
+# Seconds before a failed email is tried again, doubling up to the max
+EMAIL_RETRY_BACKOFF = int(os.environ.get("EMAIL_RETRY_BACKOFF", 30))
+EMAIL_RETRY_BACKOFF_MAX = int(os.environ.get("EMAIL_RETRY_BACKOFF_MAX", 900))
@@ -15,7 +15,7 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path
+from django.urls import include, path
 
 from ninja import NinjaAPI
 
@@ -24,6 +24,9 @@ api = NinjaAPI(title="Quizverse API", version="0.1.0")
 api.add_router("/auth/", "users.views.router", tags=["auth"])
 api.add_router("/quiz/", "quiz_viva.views.router", tags=["quiz"])
 api.add_router("/admin/", "admin.views.router", tags=["admin"])
+api.add_router("/jobs/", "jobs.views.router", tags=["jobs"])
 urlpatterns = [
+    # Plain Django routes that ninja cannot serve, like the async exam events
+    path("api/v1/quiz/", include("quiz_viva.urls")),
     path("api/v1/", api.urls),
 ]
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class UsersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "users"
+
+    def ready(self):
+        from utils.search import create_search_indexes
+
+        # Full-text indexes live outside the models, see utils.search
+        post_migrate.connect(create_search_indexes, sender=self)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from utils.search import create_search_indexes
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search indexes, e.g. after a SQLite VACUUM."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="Database to rebuild the indexes of.",
+        )
+
+    def handle(self, *args, **options):
+        create_search_indexes(using=options["database"])
+        self.stdout.write("Rebuilt search indexes")
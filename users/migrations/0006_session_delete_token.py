@@ -0,0 +1,52 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:14
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0005_user_token_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Session",
+            fields=[
+                (
+                    "id",
+                    models.CharField(
+                        default=uuid.uuid4,
+                        max_length=36,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("access_token_digest", models.CharField(max_length=64, unique=True)),
+                ("refresh_token_digest", models.CharField(max_length=64, unique=True)),
+                ("generation", models.PositiveIntegerField(default=0)),
+                ("user_agent", models.CharField(blank=True, max_length=200)),
+                (
+                    "last_seen_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="sessions",
+                        to="users.user",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "session",
+            },
+        ),
+        migrations.DeleteModel(
+            name="Token",
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:49
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0006_session_delete_token"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxEmail",
+            fields=[
+                (
+                    "id",
+                    models.CharField(
+                        default=uuid.uuid4,
+                        max_length=36,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("subject", models.CharField(max_length=200)),
+                ("body", models.TextField(blank=True)),
+                ("html_body", models.TextField(blank=True)),
+                ("from_email", models.CharField(max_length=254, null=True)),
+                ("recipients", models.JSONField(default=list)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("QUEUED", "queued"),
+                            ("SENDING", "sending"),
+                            ("SENT", "sent"),
+                            ("FAILED", "failed"),
+                        ],
+                        default="QUEUED",
+                        max_length=7,
+                    ),
+                ),
+                ("attempts", models.IntegerField(default=0)),
+                ("error", models.TextField(blank=True, default="")),
+                ("claimed_by", models.CharField(max_length=36, null=True)),
+                ("claimed_at", models.DateTimeField(null=True)),
+                ("sent_at", models.DateTimeField(null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "db_table": "outbox_email",
+                "indexes": [
+                    models.Index(
+                        fields=["status", "created_at"],
+                        name="outbox_emai_status_984274_idx",
+                    )
+                ],
+            },
+        ),
+    ]
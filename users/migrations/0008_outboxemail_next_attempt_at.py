@@ -0,0 +1,25 @@
+# Generated by Django 5.0.1 on 2026-10-18 19:39
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0007_outboxemail"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="outboxemail",
+            name="next_attempt_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name="outboxemail",
+            index=models.Index(
+                fields=["status", "next_attempt_at"],
+                name="outbox_emai_status_c54602_idx",
+            ),
+        ),
+    ]
@@ -1,5 +1,6 @@
 import uuid
 from django.db import models
+from django.utils import timezone
 
 
 class User(models.Model):
@@ -9,6 +10,7 @@ class User(models.Model):
     password = models.CharField(max_length=150)
     role = models.ManyToManyField("Role")
     is_verified = models.BooleanField(default=False)
+    token_version = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -70,15 +72,21 @@ class UserCommunityLink(models.Model):
         ]
 
 
-class Token(models.Model):
+class Session(models.Model):
+    # One row per logged in device, tokens are stored as sha256 hex digests
     id = models.CharField(primary_key=True, max_length=36, default=uuid.uuid4)
-    access_token = models.TextField()
-    refresh_token = models.TextField()
-    user = models.OneToOneField("User", on_delete=models.CASCADE)
+    user = models.ForeignKey(
+        "User", on_delete=models.CASCADE, related_name="sessions"
+    )
+    access_token_digest = models.CharField(max_length=64, unique=True)
+    refresh_token_digest = models.CharField(max_length=64, unique=True)
+    generation = models.PositiveIntegerField(default=0)
+    user_agent = models.CharField(max_length=200, blank=True)
+    last_seen_at = models.DateTimeField(default=timezone.now)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        db_table = "token"
+        db_table = "session"
 
 
 class VerificationToken(models.Model):
@@ -91,3 +99,35 @@ class VerificationToken(models.Model):
 
     class Meta:
         db_table = "verification_token"
+
+
+class OutboxEmail(models.Model):
+    # Written with the rows it is about and sent later, see users.outbox
+    STATUS_CHOICES = [
+        ("QUEUED", "queued"),
+        ("SENDING", "sending"),
+        ("SENT", "sent"),
+        ("FAILED", "failed"),
+    ]
+    id = models.CharField(primary_key=True, max_length=36, default=uuid.uuid4)
+    subject = models.CharField(max_length=200)
+    body = models.TextField(blank=True)
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254, null=True)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default="QUEUED")
+    attempts = models.IntegerField(default=0)
+    # Not sent before this, pushed back after every failed attempt
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    error = models.TextField(blank=True, default="")
+    claimed_by = models.CharField(max_length=36, null=True)
+    claimed_at = models.DateTimeField(null=True)
+    sent_at = models.DateTimeField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "outbox_email"
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+            models.Index(fields=["status", "next_attempt_at"]),
+        ]
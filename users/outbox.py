@@ -0,0 +1,138 @@
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import Q
+from django.utils import timezone
+
+from users.models import OutboxEmail
+from quizverse_backend.settings import (
+    EMAIL_BATCH_SIZE,
+    EMAIL_MAX_ATTEMPTS,
+    EMAIL_RATE_LIMIT,
+    EMAIL_RETRY_BACKOFF,
+    EMAIL_RETRY_BACKOFF_MAX,
+    JOB_LOCK_TIMEOUT,
+)
+
+
+class Throttle:
+    """
+    Spaces calls to wait() at least 1 / rate seconds apart, so a drain
+    stays under the SMTP provider's sending limit. A rate of 0 never waits.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_at = 0
+
+    def wait(self):
+        now = time.monotonic()
+        if self.next_at > now:
+            time.sleep(self.next_at - now)
+        self.next_at = max(now, self.next_at) + self.interval
+
+
+def build_message(email, connection):
+    message = EmailMultiAlternatives(
+        email.subject,
+        email.body,
+        email.from_email,
+        email.recipients,
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, "text/html")
+    return message
+
+
+def retry_delay(attempts):
+    # Seconds until an email that failed attempts times is tried again
+    return min(EMAIL_RETRY_BACKOFF * 2 ** (attempts - 1), EMAIL_RETRY_BACKOFF_MAX)
+
+
+def next_attempt_at():
+    # When the earliest queued email is due, None if the outbox is empty
+    return (
+        OutboxEmail.objects.filter(status="QUEUED")
+        .order_by("next_attempt_at")
+        .values_list("next_attempt_at", flat=True)
+        .first()
+    )
+
+
+def claim_emails(claim, batch_size):
+    """
+    Mark up to batch_size due emails as being sent under claim with a
+    conditional UPDATE, so two drains never send the same email. Emails
+    left sending by a drain that went away are claimed again.
+    """
+    now = timezone.now()
+    sendable = Q(status="QUEUED", next_attempt_at__lte=now) | Q(
+        status="SENDING", claimed_at__lt=now - timedelta(seconds=JOB_LOCK_TIMEOUT)
+    )
+    ids = list(
+        OutboxEmail.objects.filter(sendable)
+        .order_by("created_at")
+        .values_list("id", flat=True)[:batch_size]
+    )
+    OutboxEmail.objects.filter(sendable, id__in=ids).update(
+        status="SENDING", claimed_by=claim, claimed_at=now
+    )
+    return list(
+        OutboxEmail.objects.filter(claimed_by=claim, status="SENDING").order_by(
+            "created_at"
+        )
+    )
+
+
+def drain_outbox(batch_size=EMAIL_BATCH_SIZE, rate=EMAIL_RATE_LIMIT):
+    """
+    Send every queued email over one backend connection, batch_size at a
+    time and at most rate per second. A failed email is queued again with
+    its own backoff, so it holds up no other email, until it has been tried
+    EMAIL_MAX_ATTEMPTS times. Returns the number of emails sent, failed for
+    good and left queued for a retry.
+    """
+    claim = str(uuid.uuid4())
+    throttle = Throttle(rate)
+    report = {"sent": 0, "failed": 0, "retry": 0}
+    connection = get_connection()
+    try:
+        with connection:
+            while emails := claim_emails(claim, batch_size):
+                sent_ids = []
+                for email in emails:
+                    throttle.wait()
+                    try:
+                        connection.send_messages([build_message(email, connection)])
+                    except Exception as exc:
+                        attempts = email.attempts + 1
+                        status = (
+                            "FAILED" if attempts >= EMAIL_MAX_ATTEMPTS else "QUEUED"
+                        )
+                        OutboxEmail.objects.filter(id=email.id).update(
+                            status=status,
+                            attempts=attempts,
+                            next_attempt_at=timezone.now()
+                            + timedelta(seconds=retry_delay(attempts)),
+                            error=str(exc),
+                            claimed_by=None,
+                        )
+                        report["failed" if status == "FAILED" else "retry"] += 1
+                        # The connection may be broken, start the rest afresh
+                        connection.close()
+                        connection.open()
+                    else:
+                        sent_ids.append(email.id)
+                OutboxEmail.objects.filter(id__in=sent_ids).update(
+                    status="SENT", sent_at=timezone.now(), claimed_by=None
+                )
+                report["sent"] += len(sent_ids)
+    finally:
+        # Anything still claimed was never tried, hand it back
+        OutboxEmail.objects.filter(claimed_by=claim, status="SENDING").update(
+            status="QUEUED", claimed_by=None
+        )
+    return report
@@ -0,0 +1,47 @@
+from django.db import transaction
+from django.utils import timezone
+
+from users.models import OutboxEmail
+from users.outbox import drain_outbox, next_attempt_at
+from jobs.models import Job
+from jobs.tasks import enqueue, task
+
+
+@task("users.send_outbox")
+def send_outbox():
+    # Emails that failed wait for their own next attempt, picked up by a
+    # drain scheduled for the earliest of them
+    report = drain_outbox()
+    if (run_at := next_attempt_at()) is not None:
+        schedule_outbox(run_at)
+    return report
+
+
+def schedule_outbox(run_at=None):
+    """
+    Queue a drain for run_at, now by default, unless one is queued to run
+    by then already. A running drain does not count, as it may have claimed
+    its last batch before the email that scheduled this was committed.
+    """
+    run_at = run_at or timezone.now()
+    if not Job.objects.filter(
+        name=send_outbox.task_name, status="QUEUED", run_at__lte=run_at
+    ).exists():
+        enqueue(send_outbox, run_at=run_at)
+
+
+def queue_email(subject, message, recipient_list, from_email, html_message=""):
+    """
+    Write an email to the outbox in the caller's transaction, so it is sent
+    only if the rows it refers to are committed, and schedule a drain once
+    they are.
+    """
+    email = OutboxEmail.objects.create(
+        subject=subject,
+        body=message,
+        html_body=html_message,
+        from_email=from_email,
+        recipients=recipient_list,
+    )
+    transaction.on_commit(schedule_outbox)
+    return email
@@ -1,3 +1,311 @@
-from django.test import TestCase
+import json
+from smtplib import SMTPRecipientsRefused
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import make_password
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+# Loaded first, utils.authentication registers its handlers on the api
+from quizverse_backend import urls  # noqa: F401
+from jobs.models import Job
+from jobs.runner import claim_job, run_job
+from quizverse_backend.settings import EMAIL_MAX_ATTEMPTS
+from users.models import OutboxEmail, Session, User
+from users.outbox import drain_outbox
+from users.tasks import queue_email
+from utils.authentication import token_cache, token_digest
+from utils.cache import LRUCache
+from utils.search import BACKENDS, contains_backend, get_backend, search
+
+
+class SessionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            username="student@example.com",
+            email="student@example.com",
+            password=make_password("password"),
+        )
+
+    def post(self, path, data=None, token=None):
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {token}"} if token else {}
+        return self.client.post(
+            f"/api/v1/auth/{path}",
+            json.dumps(data or {}),
+            content_type="application/json",
+            **headers,
+        )
+
+    def get_user(self, token):
+        return self.client.get(
+            "/api/v1/auth/user", HTTP_AUTHORIZATION=f"Bearer {token}"
+        )
+
+    def login(self, password="password"):
+        response = self.post(
+            "login/", {"username_or_email": "student@example.com", "password": password}
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()["access_token"], response.cookies["refresh_token"].value
+
+    def refresh(self, refresh_token):
+        self.client.cookies["refresh_token"] = refresh_token
+        return self.post("refresh/")
+
+    def test_refresh_rotates_both_tokens(self):
+        access_token, refresh_token = self.login()
+        response = self.refresh(refresh_token)
+        self.assertEqual(response.status_code, 200)
+        new_access_token = response.json()["access_token"]
+        self.assertNotEqual(new_access_token, access_token)
+        self.assertNotEqual(response.cookies["refresh_token"].value, refresh_token)
+        self.assertEqual(Session.objects.get().generation, 1)
+        self.assertEqual(self.get_user(new_access_token).status_code, 200)
+        self.assertEqual(self.get_user(access_token).status_code, 401)
+
+    def test_replayed_refresh_token_revokes_session(self):
+        _, refresh_token = self.login()
+        response = self.refresh(refresh_token)
+        self.assertEqual(response.status_code, 200)
+        access_token = response.json()["access_token"]
+        new_refresh_token = response.cookies["refresh_token"].value
+
+        self.assertEqual(self.refresh(refresh_token).status_code, 400)
+        self.assertFalse(Session.objects.exists())
+        self.assertEqual(self.get_user(access_token).status_code, 401)
+        self.assertEqual(self.refresh(new_refresh_token).status_code, 400)
+
+    @mock.patch("utils.authentication.STATELESS_ACCESS_TOKENS", True)
+    def test_replayed_refresh_token_revokes_stateless_access_tokens(self):
+        _, refresh_token = self.login()
+        access_token = self.refresh(refresh_token).json()["access_token"]
+        self.assertEqual(self.get_user(access_token).status_code, 200)
+        self.assertEqual(self.refresh(refresh_token).status_code, 400)
+        self.assertEqual(self.get_user(access_token).status_code, 401)
+
+    def test_logout_revokes_only_its_session(self):
+        access_token, refresh_token = self.login()
+        other_access_token, _ = self.login()
+        response = self.post("logout/", token=access_token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_user(access_token).status_code, 401)
+        self.assertEqual(self.refresh(refresh_token).status_code, 400)
+        self.assertEqual(self.get_user(other_access_token).status_code, 200)
+
+    def test_logout_and_refresh_drop_cached_access_tokens(self):
+        access_token, refresh_token = self.login()
+        other_access_token, _ = self.login()
+        for token in (access_token, other_access_token):
+            self.assertEqual(self.get_user(token).status_code, 200)
+            self.assertIsNotNone(token_cache.get(token_digest(token)))
+        self.assertEqual(self.refresh(refresh_token).status_code, 200)
+        self.assertIsNone(token_cache.get(token_digest(access_token)))
+        self.post("logout/", token=other_access_token)
+        self.assertIsNone(token_cache.get(token_digest(other_access_token)))
+
+    def test_reset_password_revokes_every_session(self):
+        access_token, refresh_token = self.login()
+        other_access_token, _ = self.login()
+        response = self.post(
+            "reset-password/",
+            {"current_password": "password", "new_password": "new-password"},
+            token=access_token,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Session.objects.exists())
+        self.assertEqual(self.get_user(access_token).status_code, 401)
+        self.assertEqual(self.get_user(other_access_token).status_code, 401)
+        self.assertEqual(self.refresh(refresh_token).status_code, 400)
+        self.login("new-password")
+
+
+@mock.patch("utils.cache.time")
+class LRUCacheTests(SimpleTestCase):
+    def test_entry_expires_at_its_own_time_within_the_ttl(self, clock):
+        clock.time.return_value = 1000
+        cache = LRUCache(ttl=300)
+        cache.set("token", "payload", expires_at=1060)
+        cache.set("long", "payload", expires_at=5000)
+        cache.set("default", "payload")
+        clock.time.return_value = 1060
+        self.assertIsNone(cache.get("token"))
+        self.assertEqual(cache.get("long"), "payload")
+        # Entries asking for longer than the ttl are capped to it
+        clock.time.return_value = 1300
+        self.assertIsNone(cache.get("long"))
+        self.assertIsNone(cache.get("default"))
+        self.assertEqual(cache.stats()["size"], 0)
+
+    def test_least_recently_used_entry_is_evicted(self, clock):
+        clock.time.return_value = 1000
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        # Reading a makes b the least recently used
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.get("a"), cache.get("c")), (1, 3))
+        self.assertEqual(
+            cache.stats(), {"size": 2, "maxsize": 2, "hits": 3, "misses": 1}
+        )
+
+    def test_zero_maxsize_disables_the_cache(self, clock):
+        clock.time.return_value = 1000
+        cache = LRUCache(maxsize=0)
+        cache.set("a", 1)
+        self.assertIsNone(cache.get("a"))
+
+
+class BouncingBackend(locmem.EmailBackend):
+    # Refuses mail to the addresses in bounce, sends the rest to mail.outbox
+    bounce = set()
+
+    def send_messages(self, messages):
+        for message in messages:
+            if self.bounce & set(message.recipients()):
+                raise SMTPRecipientsRefused(message.recipients())
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND="users.tests.BouncingBackend")
+class OutboxTests(TestCase):
+    def setUp(self):
+        BouncingBackend.bounce = set()
+        mail.outbox = []
+
+    def queue(self, recipient):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                return queue_email("Subject", "Body", [recipient], None)
+
+    def run_jobs(self):
+        ran = 0
+        while (job := claim_job("test")) is not None:
+            run_job(job, "test")
+            ran += 1
+        return ran
+
+    def sent_to(self):
+        return [message.to for message in mail.outbox]
+
+    def test_drain_is_scheduled_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            queue_email("Subject", "Body", ["a@example.com"], None)
+        self.assertFalse(Job.objects.exists())
+        callbacks[0]()
+        self.assertEqual(Job.objects.get().name, "users.send_outbox")
+        # Another email while that drain is due does not queue a second one
+        self.queue("b@example.com")
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_rolled_back_email_is_never_sent(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    queue_email("Subject", "Body", ["a@example.com"], None)
+                    raise RuntimeError
+        self.assertFalse(OutboxEmail.objects.exists())
+        self.assertEqual(self.run_jobs(), 0)
+
+    def test_drain_sends_every_queued_email(self):
+        self.queue("a@example.com")
+        self.queue("b@example.com")
+        self.assertEqual(self.run_jobs(), 1)
+        self.assertEqual(self.sent_to(), [["a@example.com"], ["b@example.com"]])
+        self.assertEqual(
+            set(OutboxEmail.objects.values_list("status", flat=True)), {"SENT"}
+        )
+
+    def test_failed_email_is_retried_without_holding_up_others(self):
+        BouncingBackend.bounce = {"bounce@example.com"}
+        bounced = self.queue("bounce@example.com")
+        self.assertEqual(self.run_jobs(), 1)
+        bounced.refresh_from_db()
+        self.assertEqual((bounced.status, bounced.attempts), ("QUEUED", 1))
+        self.assertGreater(bounced.next_attempt_at, timezone.now())
+
+        self.queue("a@example.com")
+        self.assertEqual(self.run_jobs(), 1)
+        self.assertEqual(self.sent_to(), [["a@example.com"]])
+
+        # The retry drain runs once the bounced email is due again
+        BouncingBackend.bounce = set()
+        self.assertEqual(self.run_jobs(), 0)
+        OutboxEmail.objects.update(next_attempt_at=timezone.now())
+        Job.objects.filter(status="QUEUED").update(run_at=timezone.now())
+        self.assertEqual(self.run_jobs(), 1)
+        self.assertEqual(self.sent_to()[-1], ["bounce@example.com"])
+        self.assertEqual(OutboxEmail.objects.get(id=bounced.id).status, "SENT")
+
+    def test_email_fails_for_good_after_max_attempts(self):
+        BouncingBackend.bounce = {"bounce@example.com"}
+        bounced = self.queue("bounce@example.com")
+        for _ in range(EMAIL_MAX_ATTEMPTS):
+            OutboxEmail.objects.update(next_attempt_at=timezone.now())
+            drain_outbox(rate=0)
+        bounced.refresh_from_db()
+        self.assertEqual(
+            (bounced.status, bounced.attempts), ("FAILED", EMAIL_MAX_ATTEMPTS)
+        )
+        self.assertEqual(mail.outbox, [])
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        for username, email in (
+            ("dave@example.com", "carol.dave@example.org"),
+            ("alice@example.com", "alice@example.org"),
+            ("alfred@example.com", "alfred@example.org"),
+            ("carol@example.com", "carol@example.org"),
+        ):
+            User.objects.create(username=username, email=email)
+
+    def search(self, term, fields=("username", "email")):
+        return list(
+            search(User.objects.all(), term, list(fields)).values_list(
+                "username", flat=True
+            )
+        )
+
+    def test_indexed_fields_use_the_full_text_index(self):
+        backend = get_backend(User.objects.all(), ["email", "username"])
+        self.assertIs(backend, BACKENDS[connection.vendor])
+
+    def test_terms_match_word_prefixes(self):
+        self.assertEqual(
+            sorted(self.search("al")), ["alfred@example.com", "alice@example.com"]
+        )
+        self.assertEqual(
+            sorted(self.search("ali alf")),
+            ["alfred@example.com", "alice@example.com"],
+        )
+        # Only the start of a word, like a search box would
+        self.assertEqual(self.search("lice"), [])
+
+    def test_more_matching_fields_rank_first(self):
+        self.assertEqual(
+            self.search("carol"), ["carol@example.com", "dave@example.com"]
+        )
+
+    def test_index_follows_update_and_bulk_create(self):
+        User.objects.filter(username="alice@example.com").update(
+            username="zoe@example.com", email="zoe@example.org"
+        )
+        User.objects.bulk_create(
+            [User(username="yann@example.com", email="yann@example.org")]
+        )
+        User.objects.filter(username="alfred@example.com").delete()
+        self.assertEqual(self.search("al"), [])
+        self.assertEqual(self.search("zoe"), ["zoe@example.com"])
+        self.assertEqual(self.search("yann"), ["yann@example.com"])
+
+    def test_other_fields_fall_back_to_contains(self):
+        self.assertIs(get_backend(User.objects.all(), ["username"]), contains_backend)
+        self.assertEqual(self.search("lice", ["username"]), ["alice@example.com"])
+        # Terms a tokenizer cannot match fall back as well
+        self.assertEqual(len(self.search("@")), 4)
+        self.assertIs(get_backend(Job.objects.all(), ["name"]), contains_backend)
@@ -6,22 +6,28 @@ from ninja import Router
 from typing import Any, List
 from pydantic import EmailStr
 
-from django.core.mail import send_mail
 from django.contrib.auth.hashers import make_password, check_password
+from django.db import transaction
 from django.db.models import Q
 from django.http import JsonResponse
 from django.template.loader import get_template
 
 from users.models import *
 from users.schemas import *
+from users.tasks import queue_email
 from quizverse_backend.settings import PASSWORD_REGEX, EMAIL_HOST_USER, FRONTEND_URL
 from utils.utils import search_queryset
+from utils.principal import invalidate_principal
 from utils.authentication import (
     AuthBearer,
     role_required,
     verify_token,
-    generate_access_token,
-    generate_token,
+    create_session,
+    rotate_session,
+    revoke_sessions,
+    invalidate_access_token,
+    bump_token_version,
+    token_cache,
 )
 
 router = Router(auth=AuthBearer())
@@ -36,7 +42,7 @@ def verification_email(email):
     from_email = EMAIL_HOST_USER
     recipient_list = [email]
 
-    send_mail(
+    queue_email(
         subject,
         message="",
         html_message=email_str,
@@ -91,8 +97,9 @@ def send_verification(request):
     if user.is_verified:
         return 400, {"details": "Email already verified"}
 
-    token = verification_email(user.email)
-    VerificationToken.objects.create(user=user, token=token, token_type="verify")
+    with transaction.atomic():
+        token = verification_email(user.email)
+        VerificationToken.objects.create(user=user, token=token, token_type="verify")
     return 200, {"details": "Verification email sent"}
 
 
@@ -122,17 +129,11 @@ def login(request, login: LoginSchema):
     ).first()
 
     if user and check_password(user_data["password"], user.password):
-        access_token, refresh_token = generate_token(
-            user.id, [role.name for role in user.role.all()]
+        access_token, refresh_token = create_session(
+            user,
+            [role.name for role in user.role.all()],
+            request.headers.get("User-Agent", ""),
         )
-        if not Token.objects.filter(user_id=user.id).exists():
-            Token.objects.create(
-                user_id=user.id, access_token=access_token, refresh_token=refresh_token
-            )
-        else:
-            Token.objects.filter(user_id=user.id).update(
-                access_token=access_token, refresh_token=refresh_token
-            )
         response = JsonResponse(data={"access_token": access_token}, status=200)
         response.set_cookie(
             "refresh_token", refresh_token, httponly=True, samesite="None", secure=True
@@ -145,8 +146,9 @@ def login(request, login: LoginSchema):
 @router.post("/logout/", response={400: Any})
 def logout(request):
     data = request.auth
-    refresh_token = request.COOKIES.get("refresh_token")
-    Token.objects.filter(user_id=data["user"], refresh_token=refresh_token).delete()
+    revoke_sessions(id=data.get("sid"), user_id=data["user"])
+    invalidate_access_token(data["token"])
+    bump_token_version(data["user"])
     response = JsonResponse(data={"message": "Logout successful"}, status=200)
     response.delete_cookie("refresh_token")
     return response
@@ -163,13 +165,18 @@ def get_access_token(request):
                 "code": 400,
                 "details": {"error": "Token is invalid or expired"},
             }
-        user_id = payload["user"]
-        role = payload["roles"]
-        access_token = generate_access_token(user_id, role)
-        Token.objects.filter(user_id=user_id, refresh_token=refresh_token).update(
-            access_token=access_token
+        if (tokens := rotate_session(payload)) is None:
+            return 400, {
+                "message": "Invalid token",
+                "code": 400,
+                "details": {"error": "Token is invalid or expired"},
+            }
+        access_token, refresh_token = tokens
+        response = JsonResponse(data={"access_token": access_token}, status=200)
+        response.set_cookie(
+            "refresh_token", refresh_token, httponly=True, samesite="None", secure=True
         )
-        return 200, {"access_token": access_token}
+        return response
     except Exception as e:
         return 400, {
             "message": "Invalid token",
@@ -178,6 +185,12 @@ def get_access_token(request):
         }
 
 
+@router.get("/token-cache", response={200: Any})
+@role_required(["Admin"])
+def get_token_cache_stats(request):
+    return 200, token_cache.stats()
+
+
 @router.post("/reset-password/", response={200: Any, 400: Any, 500: Any})
 def reset_password(request, payload: ResetPasswordSchema):
     user = User.objects.get(id=request.auth["user"])
@@ -195,6 +208,8 @@ def reset_password(request, payload: ResetPasswordSchema):
         }
     user.password = make_password(payload.new_password)
     user.save()
+    revoke_sessions(user_id=user.id)
+    bump_token_version(user.id)
     return 200, {"message": "Reset password successful"}
 
 
@@ -204,13 +219,16 @@ def forgot_password(request, data: EmailSchema):
     user = User.objects.filter(email=data["email"]).first()
     if user:
         token = secrets.token_urlsafe(40)
-        VerificationToken.objects.create(user=user, token=token, token_type="forgot")
         subject = "Forgot Password"
         message = f"Your reset password link is {FRONTEND_URL}/reset/{token}. Please reset your password."
         from_email = EMAIL_HOST_USER
         recipient_list = [data["email"]]
 
-        send_mail(subject, message, from_email, recipient_list)
+        with transaction.atomic():
+            VerificationToken.objects.create(
+                user=user, token=token, token_type="forgot"
+            )
+            queue_email(subject, message, recipient_list, from_email)
         return 200, {"message": "Email sent"}
     return 400, {"message": "Email not found"}
 
@@ -230,6 +248,8 @@ def verify_forgot_otp(request, token: str, data: TextSchema):
         user = verification_token.user
         user.password = make_password(data["text_data"])
         user.save()
+        revoke_sessions(user_id=user.id)
+        bump_token_version(user.id)
         return 200, {"message": "Password reset successfully"}
     return 200, {"details": "Valid link"}
 
@@ -281,4 +301,5 @@ def accept_role(
         )
         user_community.accepted = True
         user_community.save()
+    invalidate_principal(request.auth["user"])
     return 200, {"message": "Role accepted"}
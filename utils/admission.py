@@ -0,0 +1,63 @@
+import random
+import threading
+from functools import wraps
+
+from quizverse_backend.settings import (
+    EXAM_ADMISSION_LIMIT,
+    EXAM_ADMISSION_RETRY_AFTER,
+)
+from quizverse_backend.urls import api
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+@api.exception_handler(Overloaded)
+def on_overloaded(request, exc):
+    response = api.create_response(
+        request,
+        {
+            "message": "Server is busy, try again shortly",
+            "retry_after": exc.retry_after,
+        },
+        status=503,
+    )
+    response["Retry-After"] = str(exc.retry_after)
+    return response
+
+
+class AdmissionController:
+    """
+    Bounds the requests a worker serves at once on a hot path. Requests
+    over the budget are turned away at once with a retry hint instead of
+    queueing, which keeps latency bounded for the ones admitted.
+    """
+
+    def __init__(self, limit, retry_after):
+        self.limit = limit
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(limit) if limit > 0 else None
+
+    def retry_hint(self):
+        # Jittered so rejected clients do not all come back together
+        return random.randint(self.retry_after, 2 * self.retry_after)
+
+    def __call__(self, view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if self._slots is None:
+                return view_func(request, *args, **kwargs)
+            if not self._slots.acquire(blocking=False):
+                raise Overloaded(self.retry_hint())
+            try:
+                return view_func(request, *args, **kwargs)
+            finally:
+                self._slots.release()
+
+        return wrapper
+
+
+exam_admission = AdmissionController(EXAM_ADMISSION_LIMIT, EXAM_ADMISSION_RETRY_AFTER)
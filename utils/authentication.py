@@ -1,12 +1,30 @@
 import jwt
+import uuid
+import hashlib
 from datetime import datetime, timedelta
-from quizverse_backend.settings import SECRET_KEY, JWT_ALGORITHM
-from users.models import Token
+from quizverse_backend.settings import (
+    SECRET_KEY,
+    JWT_ALGORITHM,
+    TOKEN_CACHE_SIZE,
+    TOKEN_CACHE_TTL,
+    STATELESS_ACCESS_TOKENS,
+)
+from django.db.models import F
+from django.utils import timezone
+from users.models import Session, User
+from utils.cache import LRUCache
+from utils.principal import Principal
 from quizverse_backend.urls import api
 from functools import wraps
 from ninja.security import HttpBearer
 
 
+# Verified access token payloads keyed by token digest, see verify_token
+token_cache = LRUCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+# Current User.token_version keyed by user id, see get_token_version
+token_version_cache = LRUCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+
+
 class InvalidToken(Exception):
     pass
 
@@ -33,13 +51,16 @@ class AuthBearer(HttpBearer):
     def authenticate(self, request, token):
         payload = verify_token(token, "access")
         if payload:
+            request.principal = Principal(payload)
             return payload
         else:
             raise InvalidToken
 
 
 # Function to generate a JWT token
-def generate_access_token(user_id, role):
+def generate_access_token(
+    user_id, role, token_version=0, session_id=None, generation=0
+):
     # Set the expiration time for the token (e.g., 1 hour from now)
     access_exp_time = datetime.now() + timedelta(hours=1)
     # Create the payload containing the user ID and expiration time
@@ -48,14 +69,20 @@ def generate_access_token(user_id, role):
         "exp": access_exp_time,
         "roles": role,
         "tokenType": "access",
+        "token_version": token_version,
+        "sid": session_id,
+        # Tells apart the access tokens a session rotates through in a second
+        "generation": generation,
     }
     # Generate the token using the secret key
     access_token = jwt.encode(access_payload, SECRET_KEY, algorithm=JWT_ALGORITHM)
     return access_token
 
 
-def generate_token(user_id, role):
-    access_token = generate_access_token(user_id, role)
+def generate_token(user_id, role, token_version=0, session_id=None, generation=0):
+    access_token = generate_access_token(
+        user_id, role, token_version, session_id, generation
+    )
     refresh_exp_time = datetime.now() + timedelta(days=7)
     # Create the payload containing the user ID and expiration time
     refresh_payload = {
@@ -63,14 +90,105 @@ def generate_token(user_id, role):
         "exp": refresh_exp_time,
         "roles": role,
         "tokenType": "refresh",
+        "sid": session_id,
+        "generation": generation,
     }
     # Generate the token using the secret key
     refresh_token = jwt.encode(refresh_payload, SECRET_KEY, algorithm=JWT_ALGORITHM)
     return access_token, refresh_token
 
 
+def token_digest(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def invalidate_access_token(token):
+    # Must be called whenever an access token row is rotated or deleted,
+    # otherwise the cached payload keeps it alive until its ttl runs out
+    if token:
+        token_cache.delete(token_digest(token))
+
+
+def create_session(user, role, user_agent=""):
+    session_id = str(uuid.uuid4())
+    access_token, refresh_token = generate_token(
+        user.id, role, user.token_version, session_id
+    )
+    Session.objects.create(
+        id=session_id,
+        user=user,
+        access_token_digest=token_digest(access_token),
+        refresh_token_digest=token_digest(refresh_token),
+        user_agent=user_agent[:200],
+    )
+    return access_token, refresh_token
+
+
+def rotate_session(payload):
+    """
+    Swap a verified refresh token for a new token pair on the same session.
+    Returns None if the refresh token was already rotated by someone else.
+    """
+    generation = payload["generation"] + 1
+    access_token, refresh_token = generate_token(
+        payload["user"],
+        payload["roles"],
+        get_token_version(payload["user"]),
+        payload["sid"],
+        generation,
+    )
+    rotated = Session.objects.filter(
+        id=payload["sid"], refresh_token_digest=token_digest(payload["token"])
+    ).update(
+        access_token_digest=token_digest(access_token),
+        refresh_token_digest=token_digest(refresh_token),
+        generation=generation,
+        last_seen_at=timezone.now(),
+    )
+    if not rotated:
+        return None
+    token_cache.delete(payload["access_token_digest"])
+    return access_token, refresh_token
+
+
+def revoke_sessions(**filters):
+    sessions = Session.objects.filter(**filters)
+    for digest in sessions.values_list("access_token_digest", flat=True):
+        token_cache.delete(digest)
+    # How many sessions were revoked
+    return sessions.delete()[0]
+
+
+def get_token_version(user_id):
+    if (token_version := token_version_cache.get(user_id)) is None:
+        token_version = (
+            User.objects.filter(id=user_id)
+            .values_list("token_version", flat=True)
+            .first()
+        )
+        if token_version is not None:
+            token_version_cache.set(user_id, token_version)
+    return token_version
+
+
+def bump_token_version(user_id):
+    # Revokes every token issued to the user so far when running stateless
+    User.objects.filter(id=user_id).update(token_version=F("token_version") + 1)
+    token_version_cache.delete(user_id)
+
+
+def is_current_token_version(payload):
+    return payload.get("token_version") == get_token_version(payload["user"])
+
+
 # Function to verify a JWT token
 def verify_token(token, type):
+    if type == "access":
+        digest = token_digest(token)
+        if (payload := token_cache.get(digest)) is not None:
+            if STATELESS_ACCESS_TOKENS and not is_current_token_version(payload):
+                return None
+            return dict(payload)
     try:
         # Decode the token using the secret key
         payload = jwt.decode(token, SECRET_KEY, algorithms=JWT_ALGORITHM)
@@ -82,16 +200,41 @@ def verify_token(token, type):
         if type == "access":
             if payload["tokenType"] != "access":
                 raise jwt.InvalidTokenError
-            Token.objects.get(user_id=user_id, access_token=token)
+            if STATELESS_ACCESS_TOKENS:
+                if not is_current_token_version(payload):
+                    raise jwt.InvalidTokenError
+            # Doubles as the existence check and the last seen bookkeeping
+            elif not Session.objects.filter(
+                user_id=user_id, access_token_digest=digest
+            ).update(last_seen_at=timezone.now()):
+                raise Session.DoesNotExist
         elif type == "refresh":
             if payload["tokenType"] != "refresh":
                 raise jwt.InvalidTokenError
-            Token.objects.get(user_id=user_id, refresh_token=token)
+            try:
+                session = Session.objects.get(
+                    user_id=user_id, refresh_token_digest=token_digest(token)
+                )
+            except Session.DoesNotExist:
+                # A correctly signed but superseded refresh token means it
+                # was stolen or replayed, so the whole session is revoked
+                if revoke_sessions(
+                    id=payload.get("sid"),
+                    user_id=user_id,
+                    generation__gt=payload.get("generation", 0),
+                ):
+                    # Stateless access tokens are never checked against the
+                    # session, only against the user's token version
+                    bump_token_version(user_id)
+                raise
+            payload["access_token_digest"] = session.access_token_digest
 
         payload["token"] = token
+        if type == "access":
+            token_cache.set(digest, dict(payload), expires_at=payload["exp"])
         return payload
 
-    except Token.DoesNotExist:
+    except Session.DoesNotExist:
         # Token not present in database
         return None
     except jwt.ExpiredSignatureError:
@@ -0,0 +1,65 @@
+from functools import cached_property
+
+from django.http import Http404
+
+from admin.models import Faculty, Student
+from users.models import UserInstitutionLink, UserCommunityLink
+from utils.cache import LRUCache
+from quizverse_backend.settings import PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL
+
+principal_cache = LRUCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+
+MEMBERSHIPS = ["institution_link", "community_link", "student", "faculty"]
+
+_missing = object()
+
+
+class Principal:
+    """
+    The authenticated caller attached to request.principal by AuthBearer.
+    Role memberships are loaded on first access with one query each and
+    reused for the rest of the request.
+    """
+
+    def __init__(self, payload):
+        self.user_id = payload["user"]
+        self.roles = payload["roles"]
+
+    def _load(self, name, queryset):
+        key = (self.user_id, name)
+        if (value := principal_cache.get(key, _missing)) is _missing:
+            value = queryset.filter(user_id=self.user_id).first()
+            principal_cache.set(key, value)
+        return value
+
+    @cached_property
+    def institution_link(self):
+        return self._load(
+            "institution_link", UserInstitutionLink.objects.select_related("institution")
+        )
+
+    @cached_property
+    def community_link(self):
+        return self._load(
+            "community_link", UserCommunityLink.objects.select_related("community")
+        )
+
+    @cached_property
+    def student(self):
+        return self._load("student", Student.objects.all())
+
+    @cached_property
+    def faculty(self):
+        return self._load("faculty", Faculty.objects.all())
+
+    def require(self, name):
+        if (value := getattr(self, name)) is None:
+            raise Http404(f"No {name} found for this user")
+        return value
+
+
+def invalidate_principal(*user_ids):
+    # Call after changing the memberships of a user
+    for user_id in user_ids:
+        for name in MEMBERSHIPS:
+            principal_cache.delete((user_id, name))
@@ -0,0 +1,206 @@
+import re
+
+from django.apps import apps
+from django.db import DatabaseError, connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+# Models with a full-text index and the text fields it covers. A search
+# over exactly these fields uses the index, any other falls back to LIKE.
+SEARCH_INDEXES = {
+    "users.User": ["username", "email"],
+    "admin.Institution": ["name", "place"],
+    "admin.Course": ["name", "code"],
+}
+
+
+class ContainsBackend:
+    # Every term against every field with icontains, works on any database
+    def search(self, queryset, terms, fields):
+        query = Q()
+        for field in fields:
+            for term in terms:
+                query |= Q(**{f"{field}__icontains": term})
+        return queryset.filter(query)
+
+
+class SQLiteBackend:
+    """
+    An FTS5 table per model that indexes the model's own table as external
+    content, kept in sync by triggers so bulk_create and update() are
+    covered too. Matches any term as a prefix, best bm25 rank first.
+    The models have text primary keys, so the index is keyed on the
+    implicit rowid, which VACUUM may renumber. Run rebuildsearch (or
+    migrate) after a VACUUM.
+    """
+
+    def __init__(self):
+        self.ready = set()
+
+    def index_name(self, model):
+        return f"{model._meta.db_table}_search"
+
+    def has_index(self, connection, model):
+        # Only found indexes are remembered, a missing one may be migrated in
+        key = (connection.alias, model._meta.db_table)
+        if key not in self.ready:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE name = %s",
+                    [self.index_name(model)],
+                )
+                if cursor.fetchone() is None:
+                    return False
+            self.ready.add(key)
+        return True
+
+    def search(self, queryset, terms, fields):
+        qn = connections[queryset.db].ops.quote_name
+        table = qn(queryset.model._meta.db_table)
+        index = self.index_name(queryset.model)
+        query = " OR ".join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+        # Joined rather than a subquery per row, so the FTS5 match runs once
+        # and its rank comes along with each matched rowid
+        return queryset.extra(
+            tables=[index],
+            where=[f"{qn(index)}.rowid = {table}.rowid", f"{qn(index)} MATCH %s"],
+            params=[query],
+            select={"search_rank": f"-{qn(index)}.rank"},
+            order_by=["-search_rank"],
+        )
+
+    def create_index(self, connection, model, fields):
+        qn = connection.ops.quote_name
+        table = model._meta.db_table
+        index = self.index_name(model)
+        columns = [qn(model._meta.get_field(field).column) for field in fields]
+        names = ", ".join(columns)
+        new = ", ".join(f"new.{column}" for column in columns)
+        old = ", ".join(f"old.{column}" for column in columns)
+        delete = (
+            f"INSERT INTO {qn(index)} ({qn(index)}, rowid, {names}) "
+            f"VALUES ('delete', old.rowid, {old});"
+        )
+        insert = f"INSERT INTO {qn(index)} (rowid, {names}) VALUES (new.rowid, {new});"
+        with connection.cursor() as cursor:
+            # Recreated on every migrate, as rebuilding a table drops its triggers
+            for suffix in ("insert", "delete", "update"):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {qn(f'{index}_{suffix}')}")
+            cursor.execute(f"DROP TABLE IF EXISTS {qn(index)}")
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {qn(index)} USING fts5({names}, "
+                f"content='{table}', content_rowid='rowid', prefix='2 3')"
+            )
+            for suffix, event, body in (
+                ("insert", "INSERT", insert),
+                ("delete", "DELETE", delete),
+                ("update", "UPDATE", delete + " " + insert),
+            ):
+                cursor.execute(
+                    f"CREATE TRIGGER {qn(f'{index}_{suffix}')} AFTER {event} "
+                    f"ON {qn(table)} BEGIN {body} END"
+                )
+            cursor.execute(
+                f"INSERT INTO {qn(index)} ({qn(index)}) VALUES ('rebuild')"
+            )
+        self.ready.discard((connection.alias, table))
+
+
+class PostgresBackend:
+    """
+    A GIN index on the tsvector of the model's fields. Queries repeat the
+    indexed expression word for word so the planner can use it. Matches
+    any term as a prefix, best ts_rank first.
+    """
+
+    def has_index(self, connection, model):
+        return True
+
+    def document(self, qn, model, fields, table=""):
+        prefix = f"{qn(table)}." if table else ""
+        return " || ' ' || ".join(
+            f"coalesce({prefix}{qn(model._meta.get_field(field).column)}, '')"
+            for field in fields
+        )
+
+    def search(self, queryset, terms, fields):
+        model = queryset.model
+        qn = connections[queryset.db].ops.quote_name
+        document = self.document(qn, model, fields, model._meta.db_table)
+        vector = f"to_tsvector('simple'::regconfig, {document})"
+        query = " | ".join(
+            "'{}':*".format(term.replace("\\", "\\\\").replace("'", "''"))
+            for term in terms
+        )
+        tsquery = "to_tsquery('simple'::regconfig, %s)"
+        return (
+            queryset.filter(
+                RawSQL(f"{vector} @@ {tsquery}", [query], BooleanField())
+            )
+            .annotate(
+                search_rank=RawSQL(
+                    f"ts_rank({vector}, {tsquery})", [query], FloatField()
+                )
+            )
+            .order_by("-search_rank")
+        )
+
+    def create_index(self, connection, model, fields):
+        qn = connection.ops.quote_name
+        table = model._meta.db_table
+        document = self.document(qn, model, fields)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {qn(f'{table}_search')} ON {qn(table)} "
+                f"USING GIN ((to_tsvector('simple'::regconfig, {document})))"
+            )
+
+
+contains_backend = ContainsBackend()
+BACKENDS = {"sqlite": SQLiteBackend(), "postgresql": PostgresBackend()}
+
+
+def get_backend(queryset, fields):
+    connection = connections[queryset.db]
+    backend = BACKENDS.get(connection.vendor)
+    index_fields = SEARCH_INDEXES.get(queryset.model._meta.label)
+    if (
+        backend is None
+        or index_fields is None
+        or set(fields) != set(index_fields)
+        or not backend.has_index(connection, queryset.model)
+    ):
+        return contains_backend
+    return backend
+
+
+def search(queryset, search_term, search_fields):
+    if not (terms := search_term.lower().split()):
+        return queryset
+    backend = get_backend(queryset, search_fields)
+    # Terms without a single word character cannot be matched by a tokenizer
+    if backend is not contains_backend and all(
+        re.search(r"\w", term) for term in terms
+    ):
+        return backend.search(queryset, terms, search_fields)
+    return contains_backend.search(queryset, terms, search_fields)
+
+
+def create_search_indexes(using="default", **kwargs):
+    """
+    post_migrate receiver that (re)creates the full-text index of every
+    model in SEARCH_INDEXES whose table exists, when the database has a
+    backend for it. Indexes SQLite was built without FTS5 for are skipped.
+    """
+    connection = connections[using]
+    if (backend := BACKENDS.get(connection.vendor)) is None:
+        return
+    tables = set(connection.introspection.table_names())
+    for label, fields in SEARCH_INDEXES.items():
+        model = apps.get_model(label)
+        if model._meta.db_table not in tables:
+            continue
+        try:
+            backend.create_index(connection, model, fields)
+        except DatabaseError:
+            pass
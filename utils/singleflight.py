@@ -0,0 +1,56 @@
+import threading
+
+from django.core.exceptions import EmptyResultSet
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Group:
+    """
+    Collapses concurrent calls with the same key into one. The first caller
+    runs the function while the others wait and share its result or error.
+    Nothing is kept once the call returns, so this is not a cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            if leader := call is None:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn(*args, **kwargs)
+        except Exception as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+group = Group()
+
+
+def coalesce_queryset(queryset):
+    # The compiled SQL and its params identify the rows exactly, so callers
+    # with different scopes never share a result
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return []
+    return group.do((queryset.model._meta.label, sql, tuple(params)), list, queryset)
@@ -1,14 +1,19 @@
-from django.db.models import Q
+from utils.search import search
 
 def search_queryset(queryset, search_term=None, search_fields=None):
     """
-    Search a queryset using the given search_term and search_fields.
+    Search a queryset using the given search_term and search_fields, through
+    the database's full-text index when utils.search has one for them.
     """
     if search_term and search_fields:
-        search_term = search_term.lower().split(" ")
-        query = Q()
-        for field in search_fields:
-            for term in search_term:
-                query |= Q(**{f"{field}__icontains": term})
-        return queryset.filter(query)
-    return queryset
\ No newline at end of file
+        return search(queryset, search_term, search_fields)
+    return queryset
+
+class Echo:
+    """
+    File-like object for csv.writer that hands back each written line,
+    for streaming CSV responses.
+    """
+
+    def write(self, value):
+        return value